@@ -1,18 +1,90 @@
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import json
+import os
 from sqlalchemy import select, update
-from datetime import datetime, timedelta
+from .database import AsyncSessionLocal
+from .context_digest import context_digests, render_digest
+from .embeddings import embedding_service
+from .jobs import job_queue
 from .llm import get_llm_provider
-from .memory import MemoryManager
-from .models import Message, User
-from typing import List, Dict, Any
+from .memory import MemoryManager, TurnContext
+from .memory_writer import memory_writer
+from .models import User
+from .prompts import (
+    ACTION_PROMPTS, ACTION_REPLIES, ACTION_TOOL_SCHEMAS, TOOLS,
+    build_system_messages, parse_action,
+)
+from .quizzes import claim_ready_quiz, create_quiz, expire_ready_quizzes
+from .services import append_message, load_history, rollover_session, strip_follow_up, wait_for_rollover_summary
+from .srs import quality_from_performance, record_review
+from typing import List, Dict, Any, Optional
 from .models import Conversation
 
+# Tools that only write to the database; one iteration's calls share a transaction
+DB_TOOLS = {"save_memory", "update_concept_state", "manage_gamification"}
+
+# Terminal tools: pure side effects whose results the model never needs to see.
+# A response with text plus only terminal tools ends the turn without another LLM call.
+TERMINAL_TOOLS = DB_TOOLS | {"present_quiz", "generate_cheatsheet"}
+
+# [ACTION: RESOURCES] searches for the learner's latest substantive message, capped at this many words
+RESOURCES_QUERY_MAX_WORDS = 16
+# Shorter user messages ("thanks!", "ok got it") say nothing about the topic and are skipped
+RESOURCES_QUERY_MIN_WORDS = 4
+# Placeholder titles that say nothing about the topic (see App.tsx)
+PLACEHOLDER_TITLES = {"new chat", "guest chat"}
+
+# Tools whose results are rendered to the user as protocol blocks
+BLOCK_KINDS = {
+    "present_quiz": "quiz",
+    "web_search": "resources",
+    "generate_cheatsheet": "cheatsheet",
+}
+
+# How long the event stream stays open after "done" waiting for the title job
+TITLE_WAIT_SECONDS = float(os.getenv("TITLE_WAIT_SECONDS", "15"))
+
+# Agent loop counters
+_agent_stats = {
+    "turns": 0,
+    "llm_calls": 0,
+    "tool_iterations": 0,
+    "skipped_followups": 0,
+    "action_fallbacks": 0,
+}
+
+def get_agent_stats() -> dict:
+    """ReAct loop counters, including how many follow-up LLM calls terminal tools saved."""
+    turns = _agent_stats["turns"]
+    return {
+        **_agent_stats,
+        "avg_llm_calls_per_turn": round(_agent_stats["llm_calls"] / turns, 2) if turns else 0,
+    }
+
+@job_queue.register("title")
+async def generate_title_job(payload: Dict[str, Any], session_factory=AsyncSessionLocal) -> Dict[str, Any]:
+    """Title a new conversation from its first message (job handler)."""
+    title = await Agent(user_id=payload["user_id"]).generate_title(payload["user_message"])
+    async with session_factory() as db:
+        conv_stmt = update(Conversation).where(Conversation.id == payload["conversation_id"]).values(title=title)
+        await db.execute(conv_stmt)
+        await db.commit()
+    print(f"[DEBUG] Auto-generated title: {title}")
+    return {"title": title}
+
 class Agent:
-    def __init__(self, db: AsyncSession, user_id: int = None):
+    """ReAct tutor agent.
+
+    The agent never holds a DB session across an LLM call: every database
+    access is a short unit of work on its own session from `session_factory`,
+    so pooled connections are returned while we wait on the network.
+    """
+    def __init__(self, user_id: int = None, session_factory=AsyncSessionLocal):
         self.llm = get_llm_provider(user_id)
-        self.memory = MemoryManager(db)
-        self.db = db
+        self.session_factory = session_factory
         self.user_id = user_id
+        # Buffered memory writes from this agent's tool calls (see memory_writer)
+        self.pending_writes = []
     
     async def generate_title(self, user_message: str) -> str:
         """Generate a concise chat title from the first user message"""
@@ -39,88 +111,146 @@ Title:"""
         return title
 
     async def process_message(self, user_message: str, conversation_id: int, user_id: int, is_guest_mode: bool = False):
-        # 0. Check for Rollover
-        # Count messages in this conversation
-        count_stmt = select(Message).where(Message.conversation_id == conversation_id)
-        result = await self.db.execute(count_stmt)
-        messages = result.scalars().all()
-        
-        # Get User details for gamification
-        user_stmt = select(User).where(User.id == user_id)
-        user_result = await self.db.execute(user_stmt)
-        user = user_result.scalars().first()
+        """Run a full turn and return the final response payload.
+
+        Returns as soon as the turn is done; deferred work (title, rollover
+        summary) is reported as job ids to poll via GET /jobs/{id}.
+        """
+        events = self.stream_message(user_message, conversation_id, user_id, is_guest_mode)
+        try:
+            async for event in events:
+                if event["event"] == "done":
+                    return event["data"]
+        finally:
+            await events.aclose()
+        return {}
+
+    async def stream_message(self, user_message: str, conversation_id: int, user_id: int, is_guest_mode: bool = False):
+        """Run a turn, yielding events as they happen.
+
+        Each event is a dict with "event" and "data" keys:
+        - delta: {"text": ...} model text as it arrives
+        - block: {"kind": "quiz" | "resources" | "cheatsheet", "content": ...} once a tool finishes
+        - done: the same payload process_message returns, after the assistant message is persisted
+        - title: {"title": ...} auto-generated conversation title, after done once its job finishes
+        """
+        # Quick-action buttons take a deterministic path that needs no memory context
+        action_tool = None if is_guest_mode else parse_action(user_message)
         
-        xp = 0
-        streak = 0
+        # Embed the query before opening a session so no connection waits on the encoder
+        query_embedding = None
+        if not is_guest_mode and not action_tool:
+            query_embedding = await embedding_service.embed(user_message)
+        # First turn after a rollover: let the previous session's summary land in the history
+        await wait_for_rollover_summary(conversation_id)
         
-        if user:
-            xp = user.xp
-            streak = user.streak_days
+        # Load unit of work: streak, rollover check, save user message, retrieve context.
+        # The session is closed (connection released) before any LLM call.
+        context = TurnContext()
+        ready_quiz = None
+        # PROFILE / LEARNING PROGRESS only change on memory writes: reuse the rendered
+        # sections while the user's digest version is unchanged
+        digest = None
+        digest_version = context_digests.version(user_id)
+        if not is_guest_mode and not action_tool:
+            digest = context_digests.get(user_id)
+        async with self.session_factory() as db:
+            # 0. Check for Rollover
+            # O(1) read of the maintained counter instead of loading every message
+            count_stmt = select(Conversation.message_count, Conversation.title).where(Conversation.id == conversation_id)
+            conv_row = (await db.execute(count_stmt)).first()
+            message_count = (conv_row[0] if conv_row else 0) or 0
+            conversation_title = conv_row[1] if conv_row else None
+            # Only a conversation still under its placeholder title gets one generated;
+            # follow-up conversations are titled by rollover_session
+            needs_title = message_count == 0 and (conversation_title or "").strip().lower() in PLACEHOLDER_TITLES | {""}
+            
+            # Get User details for gamification
+            user_stmt = select(User).where(User.id == user_id)
+            user_result = await db.execute(user_stmt)
+            user = user_result.scalars().first()
+            
+            xp = 0
+            streak = 0
             
-            # Update Streak Logic
-            from datetime import datetime, date
-            today = date.today()
-            last_active = user.last_active_date.date() if user.last_active_date else None
+            if user:
+                xp = user.xp
+                streak = user.streak_days
+                
+                # Update Streak Logic
+                from datetime import datetime, date
+                today = date.today()
+                last_active = user.last_active_date.date() if user.last_active_date else None
+                
+                if last_active != today:
+                    if last_active and (today - last_active).days == 1:
+                        streak += 1
+                    else:
+                        streak = 1 # Reset or start
+                    
+                    user.streak_days = streak
+                    user.last_active_date = datetime.now()
+                    db.add(user) # Mark for update, committed with the user message below
             
-            should_update = False
-            if last_active != today:
-                if last_active and (today - last_active).days == 1:
-                    streak += 1
-                else:
-                    streak = 1 # Reset or start
+            # Limit to 10 exchanges (approx 20 messages)
+            needs_rollover = message_count >= 20
+            if not needs_rollover:
+                # History for the prompt: (role, content) tuples only
+                history_msgs = [{"role": role, "content": content} for role, content in await load_history(db, conversation_id)]
                 
-                user.streak_days = streak
-                user.last_active_date = datetime.now()
-                self.db.add(user) # Mark for update
-                should_update = True
+                # 1. Save User Message
+                await append_message(db, conversation_id, "user", user_message)
                 
-            if should_update:
-                await self.db.commit()
+                # 2. Retrieve context (skip if guest mode)
+                # Semantic matches, profile, learning progress and due items come back from one query
+                if not is_guest_mode and not action_tool:
+                    context = await MemoryManager(db).get_turn_context(
+                        user_message, user_id, query_embedding=query_embedding, include_digest=digest is None
+                    )
+                    # A review quiz pre-generated by the quiz worker saves an extra tool iteration
+                    ready_quiz = await claim_ready_quiz(db, user_id, [m.content for m in context.due])
+            
+            await db.commit()
         
-        # Limit to 10 exchanges (approx 20 messages)
-        if len(messages) >= 20:
-            from .services import rollover_session
-            new_conv_id = await rollover_session(conversation_id, self.db)
-            return {
+        if needs_rollover:
+            # The new conversation exists immediately; its summary is written by a background job
+            new_conv_id, summary_job_id = await rollover_session(conversation_id)
+            yield {"event": "done", "data": {
                 "response": "This conversation has reached its limit. I have summarized our chat and started a new session for you. Please continue there!",
-                "new_conversation_id": new_conv_id
-            }
-
-        # 1. Save User Message
-        user_msg_db = Message(conversation_id=conversation_id, role="user", content=user_message)
-        self.db.add(user_msg_db)
-        await self.db.commit()
+                "new_conversation_id": new_conv_id,
+                "summary_job_id": summary_job_id
+            }}
+            return
         
-        # 2. Retrieve context (skip if guest mode)
-        unique_memories = []
-        if not is_guest_mode:
-            # Semantic search
-            relevant_memories = await self.memory.search_memory(user_message, user_id)
-            
-            # Category search (User Profile) - Always fetch these to maintain persona/identity context
-            profile_memories = await self.memory.get_memories_by_category("user_profile", user_id)
-            
-            # Category search (Learning Progress) - Fetch to understand mastery levels
-            learning_memories = await self.memory.get_memories_by_category("learning_progress", user_id)
-            due_learning_items = await self.memory.get_due_learning_items(user_id)
-            
-            # Combine and deduplicate
-            all_memories = list(relevant_memories) + list(profile_memories) + list(learning_memories) + list(due_learning_items)
-            seen_ids = set()
-            for m in all_memories:
-                if m.id not in seen_ids:
-                    unique_memories.append(m)
-                    seen_ids.add(m.id)
+        _agent_stats["turns"] += 1
+        history_msgs.append({"role": "user", "content": user_message})
         
-        print(f"DEBUG: Guest mode={is_guest_mode}, Retrieved {len(unique_memories)} memories")
-        for m in unique_memories:
-            print(f"DEBUG: Memory: {m.content} (Category: {m.metadata_.get('category')})")
-
-        context_str = "PROFILE:\n" + "\n".join([f"- {m.content}" for m in profile_memories])
-        context_str += "\n\nLEARNING PROGRESS:\n" + "\n".join([f"- {m.content} (State: {m.metadata_.get('state', 'Unknown')})" for m in learning_memories])
+        if action_tool:
+            final_response_text = ""
+            async for event in self._stream_action(action_tool, history_msgs, user_id, conversation_title):
+                final_response_text += event["data"]["text"] if event["event"] == "delta" else event["data"]["content"]
+                yield event
+            if final_response_text:
+                async for event in self._finish_turn(final_response_text, user_message, conversation_id, user_id, needs_title, is_guest_mode):
+                    yield event
+                return
+            # The forced call produced no usable tool call: answer through the regular
+            # tool loop rather than persisting an empty turn
+            _agent_stats["action_fallbacks"] += 1
+        
+        if digest is None:
+            digest = render_digest(context)
+            # An action fallback skipped retrieval, so its empty digest must not be cached
+            if not is_guest_mode and not action_tool:
+                context_digests.put(user_id, digest_version, digest)
+        print(f"DEBUG: Guest mode={is_guest_mode}, Retrieved {len(context.unique)} memories")
+
+        context_str = digest
         
-        if due_learning_items:
-            context_str += "\n\nTOPICS DUE FOR REVIEW (Active Recall):\n" + "\n".join([f"- {m.content}" for m in due_learning_items])
+        if context.due:
+            context_str += "\n\nTOPICS DUE FOR REVIEW (Active Recall):\n" + "\n".join([f"- {m.content}" for m in context.due])
+        if ready_quiz:
+            context_str += f"\n\nREVIEW QUIZ READY: {ready_quiz.concept}"
         
         # Add guest mode indicator to system prompt
         guest_mode_note = ""
@@ -128,368 +258,13 @@ Title:"""
             guest_mode_note = "\n\n**GUEST MODE**: This is a guest conversation. DO NOT save any memories. DO NOT use the save_memory tool at all."
 
         
-        system_prompt = f"""**YOUR PRIMARY JOB**: Help users learn by providing COMPREHENSIVE, ACTIONABLE, and HELPFUL responses.
-
-## 🚨🚨🚨 MANDATORY ACTION TRIGGERS 🚨🚨🚨
-**CRITICAL**: When the user message contains [ACTION: X], you MUST call the specified tool. This is NOT optional.
-
-| User Says | YOU MUST DO |
-|-----------|-------------|
-| [ACTION: QUIZ] | Call `present_quiz` with 3 questions about recent topics |
-| [ACTION: CHEATSHEET] | Call `generate_cheatsheet` with topic and sections array |
-| [ACTION: RESOURCES] | Call `web_search` with a query about the recent topic |
-
-**FAILURE TO CALL THE TOOL IS A CRITICAL ERROR.**
-
-When responding to an ACTION:
-1. Write ONE short sentence (10 words max) like "Here's your quiz!" or "Let me find resources..."
-2. IMMEDIATELY call the required tool
-3. DO NOT write explanations, summaries, or repeat previous content
-
-## 📝 RESPONSE FORMATTING (MAKE IT VISUALLY ENGAGING)
-
-Your responses must be SCANNABLE and BEAUTIFUL. Use these techniques:
-
-### Visual Hierarchy
-- Use `## Headings` for main sections
-- Use `### Subheadings` for subsections  
-- Add blank lines between sections for breathing room
-
-### Text Variety
-- Use **bold** for key terms and definitions
-- Use *italics* for emphasis or foreign terms
-- Use `inline code` for technical terms, functions, commands
-- Use > blockquotes for important notes, tips, or warnings
-
-### Lists & Structure
-- Use bullet points liberally (like this!)
-- Use numbered lists for sequential steps
-- Keep list items SHORT (one line each)
-
-### Code & Examples
-```python
-# Use code blocks for any code
-def example():
-    return "like this"
-```
-
-### Emojis (Strategic Use)
-- 📌 Pin important points
-- ⚠️ Warnings or gotchas
-- 💡 Tips and insights
-- ✅ Correct approaches
-- ❌ Common mistakes
-- 🎯 Goals or objectives
-- 📚 References
-
-### Spacing & Readability
-- Maximum 2-3 sentences per paragraph
-- Add TWO line breaks between major sections
-- Never write walls of text
-
-### Example Response Format:
-```
-## 📌 Topic Name
-
-Brief intro that hooks the reader (1-2 sentences).
-
-
-### 🔑 Key Concept 1
-
-> 💡 **Important**: This is a key insight in a blockquote.
-
-Here's the explanation in plain terms:
-- Point one
-- Point two
-- Point three
-
-
-### ⚙️ How It Works
-
-Step-by-step breakdown:
-1. First step
-2. Second step  
-3. Third step
-
-
-### ✅ Summary
-
-**Key Takeaway**: One sentence wrap-up.
-
-
----
-
-🎯 Ready to test your knowledge, or shall we explore [specific topic] next?
-```
-
-
-1. **CONTENT DELIVERY FIRST**:
-You are an AI Tutor called Siksak, not a general-purpose chatbot.
-
-Your primary responsibility is to TEACH, not just answer.
-Your success is measured by learner understanding, retention, and progress over time.
-
-────────────────────────
-CORE IDENTITY
-────────────────────────
-You are Siksak, a personalized AI tutor designed for structured learning.
-You adapt to the learner's level, remember their progress, and guide them through concepts step by step.
-
-You are not ChatGPT. You are a real teacher, mentor, and curriculum guide.
-
-────────────────────────
-TEACHING PHILOSOPHY
-────────────────────────
-Always prioritize learning over speed.
-
-Rules:
-- Break complex ideas into small, logical steps
-- Explain WHY something works, not just WHAT it is
-- Prefer clarity over cleverness
-- Keep responses SHORT and digestible (under 150 words)
-- Always suggest what to explore next
-
-If the user is confused, slow down.
-If the user is advanced, increase depth.
-If the user is wrong, correct gently and explain the misunderstanding.
-
-────────────────────────
-MEMORY & CONTEXT USAGE
-────────────────────────
-You have access to a long-term memory system.
-
-Use memory to:
-- Track what the learner has already seen
-- Avoid unnecessary repetition
-- Personalize explanations
-- Understand strengths and weak areas
-
-IMPORTANT: Do NOT mention memory operations to the user.
-Memory operations happen silently in the background.
-
-Store only educationally relevant information.
-
-────────────────────────
-GAMIFIED LEARNING MODE
-────────────────────────
-Learning should be interactive and engaging.
-
-Rules:
-- Do not always give direct answers immediately
-- Use short challenges or micro-questions
-- Encourage the learner to attempt first
-- Use light gamification language (XP, streaks, mastery levels)
-
-Examples:
-- “Quick challenge before I explain…”
-- “Nice attempt — your reasoning is improving (+XP).”
-- “You’re close to mastering this concept.”
-
-Gamification must:
-- Improve retention
-- Encourage active recall
-- Never distract from learning
-
-────────────────────────
-CURRENT LEARNER STATS
-────────────────────────
-XP: {xp}
-Streak: {streak} days
-
-────────────────────────
-LEARNING STATE & MASTERY
-────────────────────────
-Assume each concept has a learning state:
-- New
-- Practicing
-- Mastered
-
-Adapt difficulty accordingly:
-- New → more guidance
-- Practicing → hints and challenges
-- Mastered → deeper or applied questions
-
-Mention progress subtly when motivating the learner.
-
-────────────────────────
-TOOL USAGE RULES
-────────────────────────
-Your available tools:
-1. save_memory: Use this to save general facts about the user's life or preferences.
-2. update_concept_state: Use this to track the user's mastery of specific concepts (New, Practicing, Mastered).
-3. manage_gamification: Use this to award XP or update streaks.
-4. present_quiz: Display a visual interactive quiz with 3 questions.
-5. web_search: Search the web for learning resources, tutorials, and documentation.
-6. generate_cheatsheet: Create a clean, printable HTML cheatsheet summarizing key concepts.
-
-When to use tools:
-- ONLY after providing a full, helpful response.
-- Do NOT use tools to answer questions.
-- Use `update_concept_state` when the user demonstrates understanding or struggles, or explicitly starts a new topic.
-- Use `manage_gamification` when the user completes a challenge, gives a good answer, or shows engagement. Be generous with small XP amounts (10-50 XP).
-- Use `present_quiz` when you want to test the user's knowledge OR when the user asks to be quizzed.
-- Use `web_search` when the user asks for learning resources, tutorials, or external references.
-- Use `generate_cheatsheet` when the user asks for a summary, cheatsheet, or wants to consolidate learning.
-
-────────────────────────
-VISUAL QUIZ PROTOCOL
-────────────────────────
-When you use the `present_quiz` tool, provide an array of 3 questions.
-The quiz will display them sequentially to the user.
-Use quizzes to check understanding after explaining a topic.
-
-────────────────────────
-ACTIVE RECALL PROTOCOL
-────────────────────────
-The 'TOPICS DUE FOR REVIEW' section above lists concepts the user might be forgetting.
-If this list is not empty, you should:
-1. Provide your main response to the user's current input first.
-2. Then, transition: "By the way, it's time for a Neural Sync check on [Topic]."
-3. Use `present_quiz` to test that topic.
-
-────────────────────────
-NOTE ON GUEST MODE
-────────────────────────
-{guest_mode_note}
-
-=== RELEVANT CONTEXT FROM MEMORY ===
-{context_str}
-=== END OF MEMORY CONTEXT ===
-"""
+        # Static prefix + dynamic suffix (see prompts.py)
+        system_messages = build_system_messages(xp, streak, guest_mode_note, context_str)
         
         # Prepare messages from DB history
-        # We include the system prompt, then the history (including the just saved user message)
-        # Note: We re-fetch messages to include the new one and ensure order
-        # Actually we can just append the new one to 'messages' list if we didn't re-fetch, but let's be safe.
-        # But wait, 'messages' variable above is stale now.
-        
-        # Let's construct history for LLM
-        # We need to convert DB messages to LLM format
-        history_msgs = [{"role": m.role, "content": m.content} for m in messages]
-        history_msgs.append({"role": "user", "content": user_message})
-        
-        llm_messages = [{"role": "system", "content": system_prompt}] + history_msgs
-        
-        # Define tools
-        tools = [
-            {
-                "name": "save_memory",
-                "description": "Save important factual information about the user to long-term memory. ONLY use this AFTER you have provided a complete textual response. Use this for general facts like 'User is a student', 'User prefers visual learning', etc. Do NOT use for tracking specific concept mastery (use update_concept_state for that).",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "content": {"type": "string", "description": "The factual information to save"},
-                        "category": {
-                            "type": "string", 
-                            "enum": ["user_profile", "learning_preference", "general"],
-                            "description": "Category: user_profile (facts), learning_preference (style), or general."
-                        }
-                    },
-                    "required": ["content", "category"]
-                }
-            },
-            {
-                "name": "update_concept_state",
-                "description": "Update the state of a learning concept (e.g. from 'new' to 'practicing') and record performance for Spaced Repetition.",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "concept": {"type": "string", "description": "The concept name (e.g. 'Python Loops')"},
-                        "state": {
-                            "type": "string", 
-                            "enum": ["new", "practicing", "mastered"],
-                            "description": "The current mastery state."
-                        },
-                        "performance": {
-                            "type": "string",
-                            "enum": ["low", "medium", "high"],
-                            "description": "How well the user performed. High=Mastery, Low=Needs Review."
-                        }
-                    },
-                    "required": ["concept", "state"]
-                }
-            },
-            {
-                "name": "manage_gamification",
-                "description": "Award XP to the learner or update their streak. Use this to reinforce positive learning behaviors.",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "xp_amount": {"type": "integer", "description": "Amount of XP to award (e.g., 10, 20, 50)."},
-                        "reason": {"type": "string", "description": "Short reason for the award (e.g. 'Correct answer', 'Good question')."}
-                    },
-                    "required": ["xp_amount"]
-                }
-            },
-            {
-                "name": "present_quiz",
-                "description": "Display a visual, interactive multiple-choice quiz with 3 questions to the user.",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "questions": {
-                            "type": "array",
-                            "description": "Array of 3 quiz questions",
-                            "items": {
-                                "type": "object",
-                                "properties": {
-                                    "question": {"type": "string", "description": "The question to ask."},
-                                    "options": {"type": "array", "items": {"type": "string"}, "description": "List of 4 options."},
-                                    "correct_answer": {"type": "string", "description": "The correct option (must match one of the options exactly)."},
-                                    "hint": {"type": "string", "description": "A helpful hint."},
-                                    "explanation": {"type": "string", "description": "Explanation to show after they answer."},
-                                    "xp_reward": {"type": "integer", "description": "XP to award for correct answer (default 100)."}
-                                },
-                                "required": ["question", "options", "correct_answer", "explanation"]
-                            },
-                            "minItems": 3,
-                            "maxItems": 3
-                        }
-                    },
-                    "required": ["questions"]
-                }
-            },
-            {
-                "name": "web_search",
-                "description": "Search the web for learning resources, tutorials, documentation, or other educational content relevant to the current topic.",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "query": {"type": "string", "description": "The search query to find relevant resources."},
-                        "num_results": {"type": "integer", "description": "Number of results to return (default 5, max 10)."}
-                    },
-                    "required": ["query"]
-                }
-            },
-            {
-                "name": "generate_cheatsheet",
-                "description": "Generate a clean, printable HTML cheatsheet summarizing key concepts from the conversation.",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "topic": {"type": "string", "description": "The main topic of the cheatsheet."},
-                        "sections": {
-                            "type": "array",
-                            "description": "Array of sections to include in the cheatsheet.",
-                            "items": {
-                                "type": "object",
-                                "properties": {
-                                    "title": {"type": "string", "description": "Section title."},
-                                    "content": {"type": "string", "description": "Section content (can include code, examples, key points)."}
-                                },
-                                "required": ["title", "content"]
-                            }
-                        },
-                        "tips": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "description": "List of quick tips or mnemonics."
-                        }
-                    },
-                    "required": ["topic", "sections"]
-                }
-            }
-        ]
+        # We include the system prompt, then the history loaded before the user message
+        # was saved, plus the new user message itself
+        llm_messages = system_messages + history_msgs
         
         # Execution Loop (ReAct Pattern)
         turn_messages = llm_messages.copy()
@@ -499,155 +274,350 @@ NOTE ON GUEST MODE
         
         while iteration < MAX_ITERATIONS:
             iteration += 1
-            # Call LLM
-            response = await self.llm.generate(turn_messages, tools if not is_guest_mode else None)
-            
-            # Append text content to the final user response
-            if response.content:
-                final_response_text += response.content
+            # Call LLM, forwarding text deltas to the caller as they arrive
+            _agent_stats["llm_calls"] += 1
+            response = None
+            async for chunk in self.llm.stream(turn_messages, TOOLS if not is_guest_mode else None):
+                if chunk.type == "text":
+                    final_response_text += chunk.text
+                    yield {"event": "delta", "data": {"text": chunk.text}}
+                elif chunk.type == "done":
+                    response = chunk.response
             
             # If no tool calls or guest mode, we are done
             if not response.tool_calls or is_guest_mode:
                 break
             
+            _agent_stats["tool_iterations"] += 1
+            # Text answer plus only side-effect tools: nothing left for the model to do
+            done_after_tools = bool(response.content.strip()) and all(
+                tool["name"] in TERMINAL_TOOLS for tool in response.tool_calls
+            )
+            
             # Add Assistant Message (with tools) to history
             # We use the helper to format it correctly for the provider (Claude vs OpenAI)
             asst_msg = self.llm.format_tool_call_message(response.tool_calls, response.content)
             turn_messages.append(asst_msg)
             
-            # Execute Tools
-            for tool in response.tool_calls:
-                tool_name = tool["name"]
-                tool_input = tool["input"]
-                tool_id = tool["id"]
+            # Execute Tools (independent tools run concurrently; results keep call order)
+            results = await self._execute_tools(response.tool_calls, user_id)
+            for tool, (tool_result_for_llm, user_facing_log) in zip(response.tool_calls, results):
+                # Emit rendered blocks (quiz, resources, cheatsheet)
+                if user_facing_log:
+                    final_response_text += user_facing_log
+                    yield {"event": "block", "data": {"kind": BLOCK_KINDS[tool["name"]], "content": user_facing_log}}
                 
-                tool_result_for_llm = "Tool executed successfully." # Default
-                user_facing_log = ""
+                # Append Tool Result to history
+                res_msg = self.llm.format_tool_result_message(tool["id"], tool_result_for_llm)
+                turn_messages.append(res_msg)
+            
+            if done_after_tools:
+                _agent_stats["skipped_followups"] += 1
+                break
+        
+        # Attach the pre-generated review quiz; the prompt told the model not to build one
+        if ready_quiz:
+            quiz_data = {"questions": ready_quiz.questions, "concept": ready_quiz.concept, "quiz_id": ready_quiz.id}
+            quiz_block = f"\n\n:::quiz {json.dumps(quiz_data)} :::"
+            final_response_text += quiz_block
+            yield {"event": "block", "data": {"kind": "quiz", "content": quiz_block}}
+        
+        async for event in self._finish_turn(final_response_text, user_message, conversation_id, user_id, needs_title, is_guest_mode):
+            yield event
+
+    async def _stream_action(self, action_tool: str, history_msgs: List[Dict[str, Any]], user_id: int,
+                             conversation_title: Optional[str] = None):
+        """Deterministic fast path for [ACTION: X] quick actions.
+
+        Quiz and cheatsheet make exactly one LLM call with a trimmed prompt and
+        the single tool schema forced; resources builds the search query from
+        recent history and skips the LLM entirely (see _resources_query).
+        Yields delta and block events; yields nothing if the forced call returned
+        no usable tool call, so the caller can fall back to the tool loop.
+        """
+        tool_input = None
+        if action_tool == "web_search":
+            query = self._resources_query(history_msgs, conversation_title)
+            if query:
+                tool_input = {"query": query}
+        
+        if tool_input is None:
+            _agent_stats["llm_calls"] += 1
+            messages = [{"role": "system", "content": ACTION_PROMPTS[action_tool]}] + history_msgs
+            try:
+                response = await self.llm.generate(messages, ACTION_TOOL_SCHEMAS[action_tool], tool_choice=action_tool)
+            except ValueError as e:
+                # Tool-call arguments that aren't valid JSON
+                print(f"[DEBUG] Forced {action_tool} call returned unparseable arguments: {e}")
+                return
+            tool_input = next((tc["input"] for tc in response.tool_calls if tc["name"] == action_tool), None)
+            if not tool_input:
+                print(f"[DEBUG] Forced {action_tool} call returned no tool call")
+                return
+        
+        yield {"event": "delta", "data": {"text": ACTION_REPLIES[action_tool]}}
+        _, user_facing_log = await self._execute_tool({"name": action_tool, "input": tool_input}, user_id)
+        if user_facing_log:
+            yield {"event": "block", "data": {"kind": BLOCK_KINDS[action_tool], "content": user_facing_log}}
+
+    @staticmethod
+    def _resources_query(history_msgs: List[Dict[str, Any]], conversation_title: Optional[str] = None):
+        """Search query for [ACTION: RESOURCES].
+
+        The latest user message with at least RESOURCES_QUERY_MIN_WORDS words,
+        skipping action markers and short replies like "thanks!". Failing that
+        (e.g. a fresh follow-up conversation), the conversation title without
+        its "Follow-up:" prefixes. Returns None if neither says anything about
+        the topic; the forced web_search call then picks the query instead.
+        """
+        for m in reversed(history_msgs):
+            if m["role"] != "user" or parse_action(m["content"]):
+                continue
+            words = m["content"].split()
+            if len(words) >= RESOURCES_QUERY_MIN_WORDS:
+                return " ".join(words[:RESOURCES_QUERY_MAX_WORDS])
+        topic = strip_follow_up(conversation_title or "")
+        if not topic or topic.lower() in PLACEHOLDER_TITLES:
+            return None
+        return " ".join(topic.split()[:RESOURCES_QUERY_MAX_WORDS])
+
+    async def _finish_turn(self, final_response_text: str, user_message: str, conversation_id: int,
+                           user_id: int, needs_title: bool, is_guest_mode: bool):
+        """Persist the assistant message, queue titling for a new conversation,
+        and yield the done (then title) events."""
+        # Durability point: in "sync" mode this turn's memory writes land before the response
+        await memory_writer.settle(self.pending_writes)
+        self.pending_writes = []
+        
+        # 3. Save Assistant Response
+        async with self.session_factory() as db:
+            await append_message(db, conversation_id, "assistant", final_response_text)
+            await db.commit()
+        
+        # 4. Auto-generate title if this is the first message, off the request path
+        response_data = {"response": final_response_text}
+        title_job_id = None
+        
+        if needs_title and not is_guest_mode:
+            try:
+                title_job_id = await job_queue.enqueue("title", {
+                    "conversation_id": conversation_id,
+                    "user_id": user_id,
+                    "user_message": user_message
+                })
+                response_data["title_job_id"] = title_job_id
+            except Exception as e:
+                print(f"[DEBUG] Failed to queue title generation: {e}")
+        
+        yield {"event": "done", "data": response_data}
+        
+        # Streaming clients get the title on the same connection once the job finishes
+        if title_job_id:
+            job = await job_queue.wait(title_job_id, TITLE_WAIT_SECONDS)
+            if job and job.status == "done":
+                yield {"event": "title", "data": {"title": job.result["title"]}}
+
+    async def _execute_tools(self, tools: List[Dict[str, Any]], user_id: int):
+        """Execute one iteration's tool calls.
+
+        Database tools are applied together in a single transaction, with one
+        batched embedding call, while the other tools (e.g. web_search) run
+        concurrently alongside them. Results are returned in call order.
+        """
+        results = [None] * len(tools)
+        db_indexes = [i for i, tool in enumerate(tools) if tool["name"] in DB_TOOLS]
+
+        async def run_db_tools():
+            applied = await self._apply_db_tools([tools[i] for i in db_indexes], user_id)
+            for i, result in zip(db_indexes, applied):
+                results[i] = result
+
+        async def run_tool(i):
+            results[i] = await self._execute_tool(tools[i], user_id)
+
+        jobs = [run_tool(i) for i, tool in enumerate(tools) if tool["name"] not in DB_TOOLS]
+        if db_indexes:
+            jobs.append(run_db_tools())
+        await asyncio.gather(*jobs)
+        return results
+
+    async def _apply_db_tools(self, tools: List[Dict[str, Any]], user_id: int):
+        """Stage every database tool call in one session and commit once.
+
+        A tool with bad input fails on its own; a failed commit fails them all.
+        Returns (tool_result_for_llm, user_facing_log) per tool, in order.
+        """
+        results = []
+        memory_writes = []
+        try:
+            async with self.session_factory() as db:
+                for tool in tools:
+                    try:
+                        results.append((await self._stage_db_tool(db, tool, user_id, memory_writes), ""))
+                    except Exception as e:
+                        results.append((f"Error executing tool {tool['name']}: {str(e)}", ""))
+                        print(f"Tool Execution Error: {e}")
+                await db.commit()
+        except Exception as e:
+            print(f"Tool Execution Error: {e}")
+            return [(f"Error executing tool {tool['name']}: {str(e)}", "") for tool in tools]
+        
+        # Only once the transaction has committed, so a rollback never leaves a memory behind
+        for content, metadata in memory_writes:
+            self.pending_writes.append(memory_writer.submit(content, user_id, metadata=metadata))
+        if any(tool["name"] == "update_concept_state" for tool in tools):
+            context_digests.bump(user_id)
+        
+        return results
+
+    async def _stage_db_tool(self, db, tool: Dict[str, Any], user_id: int, memory_writes: list) -> str:
+        """Stage a single database tool call on `db` without committing.
+
+        Memory inserts are appended to `memory_writes` as (content, metadata);
+        the caller submits them to the write-behind buffer after the commit and
+        keeps their futures in self.pending_writes for the durability check
+        before the response. Returns the tool result for the LLM.
+        """
+        tool_name = tool["name"]
+        tool_input = tool["input"]
+        
+        if tool_name == "save_memory":
+            content_to_save = tool_input["content"]
+            category = tool_input.get("category", "general")
+            memory_writes.append((content_to_save, {"category": category}))
+            
+            tool_result_for_llm = f"Saved memory: {content_to_save}"
+            # No user-facing log - memory operations are silent
+            print(f"[DEBUG] Memory saved: {content_to_save}")
+            
+        elif tool_name == "update_concept_state":
+            concept = tool_input["concept"]
+            state = tool_input["state"]
+            performance = tool_input.get("performance", "medium")
+            
+            # Spaced Repetition (SM-2): one row per concept, next review from recall quality
+            await record_review(db, user_id, concept, state, quality_from_performance(performance), performance)
+            # Review quizzes made for the old state are stale now
+            await expire_ready_quizzes(db, user_id, concept)
+            
+            tool_result_for_llm = f"Updated concept '{concept}' to state '{state}'."
+            # No user-facing log - concept state updates are silent
+            print(f"[DEBUG] Concept state updated: {concept} -> {state}")
+            
+        elif tool_name == "manage_gamification":
+            xp_amount = tool_input["xp_amount"]
+            reason = tool_input.get("reason", "Learning activity")
+            
+            # Update User in DB
+            stmt = update(User).where(User.id == user_id).values(xp=User.xp + xp_amount)
+            await db.execute(stmt)
+            
+            tool_result_for_llm = f"Awarded {xp_amount} XP."
+            # No user-facing log - XP awards are silent
+            print(f"[DEBUG] XP awarded: +{xp_amount} for {reason}")
+        else:
+            raise ValueError(f"{tool_name} is not a database tool")
+        
+        return tool_result_for_llm
+
+    async def _execute_tool(self, tool: Dict[str, Any], user_id: int):
+        """Execute a single non-database tool call.
+
+        Returns (tool_result_for_llm, user_facing_log); the log is a rendered
+        :::quiz/:::resources/:::cheatsheet block or an empty string.
+        """
+        tool_name = tool["name"]
+        tool_input = tool["input"]
+        
+        tool_result_for_llm = "Tool executed successfully." # Default
+        user_facing_log = ""
+        
+        try:
+            if tool_name == "present_quiz":
+                import json
+                quiz_data = tool_input
+                # Ensure each question has xp_reward
+                if "questions" in quiz_data:
+                    for q in quiz_data["questions"]:
+                        q["xp_reward"] = q.get("xp_reward", 100)
+                # Store the quiz so answers can be graded server-side (POST /quizzes/{id}/answers)
+                async with self.session_factory() as db:
+                    quiz = await create_quiz(db, user_id, quiz_data)
+                    await db.commit()
+                quiz_data["quiz_id"] = quiz.id
+                
+                # Create the Protocol Block
+                json_str = json.dumps(quiz_data)
+                
+                tool_result_for_llm = "Quiz presented to user."
+                user_facing_log = f"\n\n:::quiz {json_str} :::"
+            
+            elif tool_name == "web_search":
+                import json
+                from duckduckgo_search import DDGS
+                
+                query = tool_input["query"]
+                num_results = min(tool_input.get("num_results", 5), 10)
+                
+                def search():
+                    with DDGS() as ddgs:
+                        # region='wt-wt' = worldwide English, ensures English results
+                        return list(ddgs.text(query, region='wt-wt', max_results=num_results))
                 
                 try:
-                    if tool_name == "save_memory":
-                        content_to_save = tool_input["content"]
-                        category = tool_input.get("category", "general")
-                        await self.memory.add_memory(content_to_save, user_id, metadata={"category": category})
-                        
-                        tool_result_for_llm = f"Saved memory: {content_to_save}"
-                        # No user-facing log - memory operations are silent
-                        print(f"[DEBUG] Memory saved: {content_to_save}")
-                        
-                    elif tool_name == "update_concept_state":
-                        concept = tool_input["concept"]
-                        state = tool_input["state"]
-                        performance = tool_input.get("performance", "medium")
-                        
-                        # Logic for Spaced Repetition (SRS)
-                        days_to_add = 1
-                        if performance == "medium": days_to_add = 3
-                        if performance == "high": days_to_add = 14
-                        
-                        next_review = (datetime.now() + timedelta(days=days_to_add)).isoformat()
-                        
-                        meta = {
-                            "category": "learning_progress", 
-                            "state": state,
-                            "last_performance": performance,
-                            "last_reviewed_date": datetime.now().isoformat(),
-                            "next_review_date": next_review
-                        }
-                        
-                        await self.memory.add_memory(concept, user_id, metadata=meta)
-                        
-                        tool_result_for_llm = f"Updated concept '{concept}' to state '{state}'."
-                        # No user-facing log - concept state updates are silent
-                        print(f"[DEBUG] Concept state updated: {concept} -> {state}")
-                        
-                    elif tool_name == "manage_gamification":
-                        xp_amount = tool_input["xp_amount"]
-                        reason = tool_input.get("reason", "Learning activity")
-                        
-                        # Update User in DB
-                        stmt = update(User).where(User.id == user_id).values(xp=User.xp + xp_amount)
-                        await self.db.execute(stmt)
-                        await self.db.commit()
-                        
-                        tool_result_for_llm = f"Awarded {xp_amount} XP."
-                        # No user-facing log - XP awards are silent
-                        print(f"[DEBUG] XP awarded: +{xp_amount} for {reason}")
-                        
-                    elif tool_name == "present_quiz":
-                        import json
-                        quiz_data = tool_input
-                        # Ensure each question has xp_reward
-                        if "questions" in quiz_data:
-                            for q in quiz_data["questions"]:
-                                q["xp_reward"] = q.get("xp_reward", 100)
-                        # Create the Protocol Block
-                        json_str = json.dumps(quiz_data)
-                        
-                        tool_result_for_llm = "Quiz presented to user."
-                        user_facing_log = f"\n\n:::quiz {json_str} :::"
+                    # DDGS is blocking; run it off the event loop so other tools proceed
+                    results = await asyncio.to_thread(search)
                     
-                    elif tool_name == "web_search":
-                        import json
-                        from duckduckgo_search import DDGS
-                        
-                        query = tool_input["query"]
-                        num_results = min(tool_input.get("num_results", 5), 10)
-                        
-                        try:
-                            with DDGS() as ddgs:
-                                # region='wt-wt' = worldwide English, ensures English results
-                                results = list(ddgs.text(query, region='wt-wt', max_results=num_results))
-                            
-                            # Format results for display
-                            resources = []
-                            for r in results:
-                                resources.append({
-                                    "title": r.get("title", ""),
-                                    "url": r.get("href", r.get("link", "")),
-                                    "description": r.get("body", r.get("snippet", ""))
-                                })
-                            
-                            resource_data = {
-                                "query": query,
-                                "resources": resources
-                            }
-                            json_str = json.dumps(resource_data)
-                            
-                            tool_result_for_llm = f"Found {len(resources)} resources for '{query}'."
-                            user_facing_log = f"\n\n:::resources {json_str} :::"
-                            print(f"[DEBUG] Web search for '{query}': found {len(resources)} results")
-                        except Exception as e:
-                            tool_result_for_llm = f"Web search failed: {str(e)}"
-                            print(f"[DEBUG] Web search error: {e}")
+                    # Format results for display
+                    resources = []
+                    for r in results:
+                        resources.append({
+                            "title": r.get("title", ""),
+                            "url": r.get("href", r.get("link", "")),
+                            "description": r.get("body", r.get("snippet", ""))
+                        })
                     
-                    elif tool_name == "generate_cheatsheet":
-                        import json
-                        
-                        topic = tool_input["topic"]
-                        sections = tool_input.get("sections", [])
-                        tips = tool_input.get("tips", [])
-                        
-                        # Generate styled HTML cheatsheet
-                        sections_html = ""
-                        for section in sections:
-                            # Escape HTML and convert newlines
-                            content = section["content"].replace("\n", "<br>")
-                            sections_html += f'''
+                    resource_data = {
+                        "query": query,
+                        "resources": resources
+                    }
+                    json_str = json.dumps(resource_data)
+                    
+                    tool_result_for_llm = f"Found {len(resources)} resources for '{query}'."
+                    user_facing_log = f"\n\n:::resources {json_str} :::"
+                    print(f"[DEBUG] Web search for '{query}': found {len(resources)} results")
+                except Exception as e:
+                    tool_result_for_llm = f"Web search failed: {str(e)}"
+                    print(f"[DEBUG] Web search error: {e}")
+            
+            elif tool_name == "generate_cheatsheet":
+                import json
+                
+                topic = tool_input["topic"]
+                sections = tool_input.get("sections", [])
+                tips = tool_input.get("tips", [])
+                
+                # Generate styled HTML cheatsheet
+                sections_html = ""
+                for section in sections:
+                    # Escape HTML and convert newlines
+                    content = section["content"].replace("\n", "<br>")
+                    sections_html += f'''
                             <div class="section">
                                 <h3>{section["title"]}</h3>
                                 <div class="content">{content}</div>
                             </div>'''
-                        
-                        tips_html = ""
-                        if tips:
-                            tips_items = "".join([f"<li>{tip}</li>" for tip in tips])
-                            tips_html = f'''
+                
+                tips_html = ""
+                if tips:
+                    tips_items = "".join([f"<li>{tip}</li>" for tip in tips])
+                    tips_html = f'''
                             <div class="tips">
                                 <h3>💡 Quick Tips</h3>
                                 <ul>{tips_items}</ul>
                             </div>'''
-                        
-                        html_content = f'''<!DOCTYPE html>
+                
+                html_content = f'''<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -709,50 +679,22 @@ NOTE ON GUEST MODE
     {tips_html}
 </body>
 </html>'''
-                        
-                        cheatsheet_data = {
-                            "topic": topic,
-                            "html": html_content
-                        }
-                        json_str = json.dumps(cheatsheet_data)
-                        
-                        tool_result_for_llm = f"Cheatsheet for '{topic}' generated successfully."
-                        user_facing_log = f"\n\n:::cheatsheet {json_str} :::"
-                        print(f"[DEBUG] Generated cheatsheet for '{topic}'")
-                        
-                    else:
-                        tool_result_for_llm = f"Error: Unknown tool {tool_name}"
                 
-                except Exception as e:
-                    tool_result_for_llm = f"Error executing tool {tool_name}: {str(e)}"
-                    print(f"Tool Execution Error: {e}")
+                cheatsheet_data = {
+                    "topic": topic,
+                    "html": html_content
+                }
+                json_str = json.dumps(cheatsheet_data)
                 
-                # Append user facing log -> We want the user to see these updates immediately in the text stream
-                # usually, but here we just append to the final block.
-                final_response_text += user_facing_log
+                tool_result_for_llm = f"Cheatsheet for '{topic}' generated successfully."
+                user_facing_log = f"\n\n:::cheatsheet {json_str} :::"
+                print(f"[DEBUG] Generated cheatsheet for '{topic}'")
                 
-                # Append Tool Result to history
-                res_msg = self.llm.format_tool_result_message(tool_id, tool_result_for_llm)
-                turn_messages.append(res_msg)
-        
-        # 3. Save Assistant Response
-        ai_msg_db = Message(conversation_id=conversation_id, role="assistant", content=final_response_text)
-        self.db.add(ai_msg_db)
-        await self.db.commit()
+            else:
+                tool_result_for_llm = f"Error: Unknown tool {tool_name}"
         
-        # 4. Auto-generate title if this is the first message
-        response_data = {"response": final_response_text}
-        
-        if len(messages) == 0 and not is_guest_mode:
-            try:
-                new_title = await self.generate_title(user_message)
-                # Update conversation title in DB
-                conv_stmt = update(Conversation).where(Conversation.id == conversation_id).values(title=new_title)
-                await self.db.execute(conv_stmt)
-                await self.db.commit()
-                response_data["new_title"] = new_title
-                print(f"[DEBUG] Auto-generated title: {new_title}")
-            except Exception as e:
-                print(f"[DEBUG] Failed to generate title: {e}")
+        except Exception as e:
+            tool_result_for_llm = f"Error executing tool {tool_name}: {str(e)}"
+            print(f"Tool Execution Error: {e}")
         
-        return response_data
+        return tool_result_for_llm, user_facing_log
@@ -0,0 +1,70 @@
+"""Measure CPU embedding throughput of each backend in sentences per second.
+
+Encodes the same corpus with every backend at each batch size: batch size 1
+is the latency of a single chat-turn embed, larger batches are what the
+EmbeddingService batcher and MemoryWriteBuffer flushes send. Load time covers
+importing the runtime and reading the weights, which is paid at startup.
+
+Run from backend/ with the relevant requirements installed and, for the onnx
+backends, the model exported with app.export_onnx_model:
+    python -m app.bench_embeddings --backends sentence-transformers,onnx,onnx-int8 --threads 4
+"""
+import argparse
+import sys
+import time
+
+from app.check_embedding_parity import SENTENCES, VARIANTS, load_variant
+from app.embedding_backends import EMBEDDING_ONNX_DIR, EMBEDDING_THREADS
+
+
+def corpus(size: int) -> list:
+    """Distinct memory-sized sentences, so nothing can be answered from a cache.
+
+    The parity corpus's truncation-length sentence is left out: repeated in
+    every batch it would pad them all to max_seq_length.
+    """
+    base = [s for s in SENTENCES if s.strip() and len(s) < 300]
+    return [f"{base[i % len(base)]} (note {i})" for i in range(size)]
+
+
+def bench(args) -> int:
+    sentences = corpus(args.sentences)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    report = []
+    for variant in args.backends.split(","):
+        if variant not in VARIANTS:
+            print(f"Unknown backend {variant}, expected one of {', '.join(VARIANTS)}")
+            return 1
+        started = time.perf_counter()
+        backend = load_variant(variant, args.onnx_dir, args.threads)
+        backend.load()
+        load_seconds = time.perf_counter() - started
+        backend.encode(sentences[:args.warmup])
+
+        for batch_size in batch_sizes:
+            batches = [sentences[i:i + batch_size] for i in range(0, len(sentences), batch_size)]
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                for batch in batches:
+                    backend.encode(batch)
+            elapsed = time.perf_counter() - started
+            report.append((variant, batch_size, len(sentences) * args.repeat / elapsed,
+                           elapsed / (len(batches) * args.repeat) * 1000, load_seconds))
+
+    print(f"\n{len(sentences)} sentences x {args.repeat}, threads={args.threads or 'default'}")
+    print(f"{'backend':<22} {'batch':>6} {'sent/s':>9} {'ms/batch':>9} {'load s':>7}")
+    for variant, batch_size, rate, ms, load in report:
+        print(f"{variant:<22} {batch_size:>6} {rate:>9.1f} {ms:>9.2f} {load:>7.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default=",".join(VARIANTS))
+    parser.add_argument("--onnx-dir", default=EMBEDDING_ONNX_DIR)
+    parser.add_argument("--sentences", type=int, default=512)
+    parser.add_argument("--batch-sizes", default="1,32")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS)
+    sys.exit(bench(parser.parse_args()))
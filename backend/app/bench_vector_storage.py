@@ -0,0 +1,206 @@
+"""Compare recall and latency of the memory vector storage modes on synthetic data.
+
+Builds one scratch table per MEMORY_VECTOR_STORAGE mode (vector, halfvec,
+binary) from the same clustered synthetic embeddings, spread over --users
+users. Each table is indexed the way migration 1234567890b5 does, plus a
+user_id btree as in production. The same queries then run against all three,
+in production shape: filtered to one user, with iterative index scans set as
+MemoryManager does. Recall@k is measured against an exact float32 scan of
+that user's rows. "Under-filled" counts queries that got back fewer than k
+rows although the user has at least k. Table and index sizes are reported
+alongside latency. The scratch tables are dropped afterwards unless --keep
+is given.
+
+Run from backend/ against a local Postgres with pgvector >= 0.7:
+    python -m app.bench_vector_storage --rows 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import text
+
+from app.database import AsyncSessionLocal
+from app.models import EMBEDDING_DIM, MEMORY_HNSW_EF_CONSTRUCTION, MEMORY_HNSW_M
+
+MODES = {
+    "vector": ("bench_memories_vector", "embedding vector_cosine_ops"),
+    "halfvec": ("bench_memories_halfvec", "embedding halfvec_cosine_ops"),
+    "binary": ("bench_memories_binary", "embedding_bits bit_hamming_ops"),
+}
+
+# Same query shapes as MemoryManager.search_memory in each mode
+SEARCH_SQL = {
+    "vector": "SELECT id FROM bench_memories_vector WHERE user_id = :user_id ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k",
+    "halfvec": "SELECT id FROM bench_memories_halfvec WHERE user_id = :user_id ORDER BY embedding <=> CAST(:q AS halfvec) LIMIT :k",
+    "binary": (
+        "SELECT id FROM bench_memories_binary WHERE user_id = :user_id AND id IN ("
+        "    SELECT id FROM bench_memories_binary WHERE user_id = :user_id"
+        "    ORDER BY embedding_bits <~> binary_quantize(CAST(:q AS vector)) LIMIT :candidates"
+        ") ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k"
+    ),
+}
+EXACT_SQL = "SELECT id FROM bench_memories_vector WHERE user_id = :user_id ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k"
+
+
+def vector_literal(values) -> str:
+    return "[" + ",".join(f"{v:.6f}" for v in values) + "]"
+
+
+async def seed(session, rows: int, clusters: int, noise: float, users: int):
+    """Clustered unit-ish vectors, so nearest neighbours are meaningful, dealt out across users."""
+    await session.execute(text(
+        "CREATE UNLOGGED TABLE bench_centers AS "
+        "SELECT c AS id, (SELECT array_agg(random() - 0.5 + c * 0) FROM generate_series(1, :dim)) AS v "
+        "FROM generate_series(0, :clusters - 1) c"
+    ), {"dim": EMBEDDING_DIM, "clusters": clusters})
+    await session.execute(text(
+        f"CREATE UNLOGGED TABLE bench_memories_vector (id integer PRIMARY KEY, user_id integer, embedding vector({EMBEDDING_DIM}))"
+    ))
+    # Users are independent of clusters, so every user's rows are spread over the whole space
+    await session.execute(text(
+        "INSERT INTO bench_memories_vector (id, user_id, embedding) "
+        "SELECT g, 1 + (hashint4(g) & 2147483647) % :users, "
+        "(SELECT array_agg(c.v[i] + (random() - 0.5) * :noise) FROM generate_series(1, :dim) i)::vector "
+        "FROM generate_series(1, :rows) g JOIN bench_centers c ON c.id = g % :clusters"
+    ), {"rows": rows, "dim": EMBEDDING_DIM, "clusters": clusters, "noise": noise, "users": users})
+    await session.execute(text(
+        f"CREATE UNLOGGED TABLE bench_memories_halfvec AS "
+        f"SELECT id, user_id, embedding::halfvec({EMBEDDING_DIM}) AS embedding FROM bench_memories_vector"
+    ))
+    await session.execute(text("ALTER TABLE bench_memories_halfvec ADD PRIMARY KEY (id)"))
+    await session.execute(text(
+        f"CREATE UNLOGGED TABLE bench_memories_binary ("
+        f"  id integer PRIMARY KEY, user_id integer, embedding vector({EMBEDDING_DIM}),"
+        f"  embedding_bits bit({EMBEDDING_DIM}) GENERATED ALWAYS AS (binary_quantize(embedding)::bit({EMBEDDING_DIM})) STORED)"
+    ))
+    await session.execute(text(
+        "INSERT INTO bench_memories_binary (id, user_id, embedding) SELECT id, user_id, embedding FROM bench_memories_vector"
+    ))
+    for table, _ in MODES.values():
+        await session.execute(text(f"CREATE INDEX {table}_user_id ON {table} (user_id)"))
+    await session.commit()
+
+
+async def build_indexes(session) -> dict:
+    build_seconds = {}
+    for mode, (table, column) in MODES.items():
+        started = time.perf_counter()
+        await session.execute(text(
+            f"CREATE INDEX {table}_ann ON {table} USING hnsw ({column}) "
+            f"WITH (m = {MEMORY_HNSW_M}, ef_construction = {MEMORY_HNSW_EF_CONSTRUCTION})"
+        ))
+        await session.commit()
+        build_seconds[mode] = time.perf_counter() - started
+        print(f"  {mode}: index built in {build_seconds[mode]:.1f}s")
+    await session.execute(text(f"ANALYZE {', '.join(table for table, _ in MODES.values())}"))
+    await session.commit()
+    return build_seconds
+
+
+async def sample_queries(session, count: int, rows: int) -> list:
+    """(user_id, query) pairs: perturbed copies of random stored vectors, searched within their owner's rows."""
+    queries = []
+    for row_id in random.sample(range(1, rows + 1), count):
+        user_id, embedding = (await session.execute(
+            text("SELECT user_id, embedding::text FROM bench_memories_vector WHERE id = :id"), {"id": row_id}
+        )).one()
+        values = [float(v) for v in embedding.strip("[]").split(",")]
+        queries.append((user_id, vector_literal(v + random.uniform(-0.05, 0.05) for v in values)))
+    return queries
+
+
+async def resolve_iterative_scan(session, requested: str) -> str:
+    """Same resolution as MemoryManager.iterative_scan_mode."""
+    if requested != "auto":
+        return requested
+    version = (await session.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'"))).scalar()
+    await session.commit()
+    supported = version is not None and tuple(int(part) for part in version.split(".")[:2]) >= (0, 8)
+    return "relaxed_order" if supported else "off"
+
+
+async def run(args) -> int:
+    async with AsyncSessionLocal() as session:
+        for table in [t for t, _ in MODES.values()] + ["bench_centers"]:
+            await session.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        await session.commit()
+
+        print(f"Seeding {args.rows} rows in {args.clusters} clusters for {args.users} users...")
+        started = time.perf_counter()
+        await seed(session, args.rows, args.clusters, args.noise, args.users)
+        print(f"  seeded in {time.perf_counter() - started:.1f}s")
+        print("Building HNSW indexes...")
+        build_seconds = await build_indexes(session)
+        queries = await sample_queries(session, args.queries, args.rows)
+        iterative_scan = await resolve_iterative_scan(session, args.iterative_scan)
+
+        await session.commit()
+
+        print(f"Exact top-{args.k} for {len(queries)} queries...")
+        truth = []
+        for user_id, q in queries:
+            await session.execute(text("SET LOCAL enable_indexscan = off"))
+            ids = (await session.execute(text(EXACT_SQL), {"q": q, "k": args.k, "user_id": user_id})).scalars().all()
+            await session.commit()
+            truth.append(set(ids))
+
+        report = []
+        candidates = args.k * args.rerank_factor
+        for mode, (table, _) in MODES.items():
+            # An HNSW scan returns at most ef_search rows; binary needs room for every candidate
+            ef_search = max(args.ef_search, candidates) if mode == "binary" else args.ef_search
+            latencies, recalls, underfilled = [], [], 0
+            for (user_id, q), expected in zip(queries, truth):
+                await session.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+                if iterative_scan != "off":
+                    await session.execute(text(f"SET LOCAL hnsw.iterative_scan = {iterative_scan}"))
+                params = {"q": q, "k": args.k, "candidates": candidates, "user_id": user_id}
+                started = time.perf_counter()
+                ids = (await session.execute(text(SEARCH_SQL[mode]), params)).scalars().all()
+                latencies.append((time.perf_counter() - started) * 1000)
+                await session.commit()
+                recalls.append(len(expected.intersection(ids)) / len(expected))
+                underfilled += len(ids) < len(expected)
+            sizes = (await session.execute(text(
+                "SELECT pg_table_size(:t), pg_indexes_size(:t)"
+            ), {"t": table})).one()
+            await session.commit()
+            latencies.sort()
+            report.append((
+                mode, statistics.mean(recalls), underfilled / len(queries), latencies[len(latencies) // 2],
+                latencies[int(len(latencies) * 0.95) - 1], sizes[0], sizes[1], build_seconds[mode]
+            ))
+
+        if not args.keep:
+            for table in [t for t, _ in MODES.values()] + ["bench_centers"]:
+                await session.execute(text(f"DROP TABLE IF EXISTS {table}"))
+            await session.commit()
+
+    mb = 1024 * 1024
+    print(f"\n{args.rows} rows over {args.users} users, k={args.k}, ef_search={args.ef_search}, "
+          f"iterative_scan={iterative_scan}, binary rerank factor={args.rerank_factor}")
+    print(f"{'mode':<8} {'recall@k':>9} {'under-filled':>13} {'p50 ms':>8} {'p95 ms':>8} {'table MB':>9} {'index MB':>9} {'build s':>8}")
+    for mode, recall, underfilled, p50, p95, table_bytes, index_bytes, build in report:
+        print(f"{mode:<8} {recall:>9.3f} {underfilled:>12.1%} {p50:>8.2f} {p95:>8.2f} "
+              f"{table_bytes / mb:>9.1f} {index_bytes / mb:>9.1f} {build:>8.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--iterative-scan", default="auto", choices=["auto", "off", "relaxed_order", "strict_order"],
+                        help="hnsw.iterative_scan; auto resolves as MemoryManager does")
+    parser.add_argument("--noise", type=float, default=0.3)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, default=40)
+    parser.add_argument("--rerank-factor", type=int, default=10)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch tables")
+    sys.exit(asyncio.run(run(parser.parse_args())))
@@ -0,0 +1,126 @@
+"""Check that the ONNX embedding backends agree with sentence-transformers.
+
+Encodes the same sentences with the reference sentence-transformers backend
+and with each candidate, then compares every pairwise cosine similarity.
+That is what memory search and MEMORY_DEDUPE_THRESHOLD actually consume.
+Also reports how close each candidate vector is to its reference vector, how
+many top-5 neighbours are shared, and how many pairs flip across the dedupe
+threshold. Exits non-zero if any candidate's largest similarity error exceeds
+its tolerance.
+
+Run from backend/ with both requirements files installed and the model exported:
+    python -m app.check_embedding_parity --candidates onnx,onnx-int8
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from app.embedding_backends import EMBEDDING_ONNX_DIR, EMBEDDING_THREADS, EmbeddingBackend, load_backend
+
+VARIANTS = ("sentence-transformers", "onnx", "onnx-int8")
+# Largest allowed |cos_ref - cos_candidate| over all sentence pairs
+DEFAULT_TOLERANCE = {"onnx": 0.01, "onnx-int8": 0.05}
+
+SENTENCES = [
+    "The user is a 4th semester computer science student.",
+    "The user is a fourth-semester CS undergraduate.",
+    "Prefers short explanations with code examples.",
+    "Likes concise answers that include code snippets.",
+    "Is doing a NestJS and NextJS internship but doesn't know JavaScript well.",
+    "Currently interning on a fullstack team using NestJS and Next.js.",
+    "Struggles with recursion, especially base cases.",
+    "Finds recursive functions confusing and forgets the base case.",
+    "Understands binary search well.",
+    "Knows how to binary search a sorted array.",
+    "Wants to prepare for technical interviews in three months.",
+    "Learning Spanish in the evenings.",
+    "Asked about the difference between TCP and UDP.",
+    "Got a low score on the SQL joins quiz.",
+    "Mastered Python list comprehensions.",
+    "Is confused by JavaScript closures and the event loop.",
+    "Is learning about gradient descent and backpropagation.",
+    "Has a dog named Momo.",
+    "who am i?",
+    "What should I study next?",
+    "Explain the CAP theorem with an example.",
+    "Quiz me on React hooks.",
+    "useEffect runs after render; useLayoutEffect runs before paint.",
+    "A hash map gives average O(1) lookups but O(n) in the worst case.",
+    "Dijkstra's algorithm does not work with negative edge weights.",
+    "Photosynthesis converts light energy into chemical energy.",
+    "The mitochondria is the powerhouse of the cell.",
+    "Prefers studying late at night.",
+    "",
+    "ok",
+    " ".join(["The user keeps a detailed journal of everything they learn each week,"
+              " including notes on algorithms, databases, networking and web frameworks."] * 12),
+]
+
+
+def load_variant(variant: str, onnx_dir: str = EMBEDDING_ONNX_DIR, threads: int = EMBEDDING_THREADS) -> EmbeddingBackend:
+    if variant == "sentence-transformers":
+        return load_backend(variant, threads=threads)
+    return load_backend("onnx", model_dir=onnx_dir, quantize=variant == "onnx-int8", threads=threads)
+
+
+def compare(reference: np.ndarray, candidate: np.ndarray, threshold: float) -> dict:
+    reference = reference / np.maximum(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12)
+    candidate = candidate / np.maximum(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12)
+    vector_cosines = (reference * candidate).sum(axis=1)
+
+    ref_sims, cand_sims = reference @ reference.T, candidate @ candidate.T
+    upper = np.triu_indices(len(reference), k=1)
+    errors = np.abs(ref_sims - cand_sims)[upper]
+    flips = int(((ref_sims[upper] >= threshold) != (cand_sims[upper] >= threshold)).sum())
+
+    k = min(5, len(reference) - 1)
+    np.fill_diagonal(ref_sims, -np.inf)
+    np.fill_diagonal(cand_sims, -np.inf)
+    ref_top = np.argsort(-ref_sims, axis=1)[:, :k]
+    cand_top = np.argsort(-cand_sims, axis=1)[:, :k]
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)])
+
+    return {
+        "min_vector_cosine": float(vector_cosines.min()),
+        "max_sim_error": float(errors.max()),
+        "mean_sim_error": float(errors.mean()),
+        "top5_overlap": float(overlap),
+        "threshold_flips": flips,
+    }
+
+
+def check(args) -> int:
+    sentences = list(SENTENCES)
+    if args.file:
+        with open(args.file) as f:
+            sentences += [line.rstrip("\n") for line in f if line.strip()]
+
+    reference = load_variant("sentence-transformers", args.onnx_dir, args.threads).encode(sentences)
+    failures = 0
+    print(f"{len(sentences)} sentences, {len(sentences) * (len(sentences) - 1) // 2} pairs, "
+          f"dedupe threshold {args.threshold}")
+    for variant in args.candidates.split(","):
+        if variant not in VARIANTS[1:]:
+            print(f"[FAIL] {variant}: unknown candidate, expected one of {', '.join(VARIANTS[1:])}")
+            failures += 1
+            continue
+        tolerance = args.tolerance if args.tolerance is not None else DEFAULT_TOLERANCE[variant]
+        result = compare(reference, load_variant(variant, args.onnx_dir, args.threads).encode(sentences), args.threshold)
+        status = "ok" if result["max_sim_error"] <= tolerance else "FAIL"
+        failures += status == "FAIL"
+        print(f"[{status}] {variant}: max |Δcos| {result['max_sim_error']:.4f} (tolerance {tolerance}), "
+              f"mean |Δcos| {result['mean_sim_error']:.5f}, min vector cosine {result['min_vector_cosine']:.4f}, "
+              f"top-5 overlap {result['top5_overlap']:.3f}, threshold flips {result['threshold_flips']}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--candidates", default="onnx,onnx-int8")
+    parser.add_argument("--onnx-dir", default=EMBEDDING_ONNX_DIR)
+    parser.add_argument("--file", help="Extra sentences, one per line")
+    parser.add_argument("--tolerance", type=float, help="Override the per-candidate tolerance")
+    parser.add_argument("--threshold", type=float, default=0.92, help="memory.MEMORY_DEDUPE_THRESHOLD")
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS)
+    sys.exit(check(parser.parse_args()))
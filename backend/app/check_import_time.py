@@ -0,0 +1,86 @@
+"""Guard against startup regressions: time `import app.main` in a fresh interpreter.
+
+Runs the import --runs times, each in a new process with -X importtime, and
+keeps the fastest. Exits non-zero if the import pulled in any heavy module,
+which must only load on first use or during the lifespan warm-up. It also
+fails if the fastest run exceeds --budget-ms. The slowest imports are listed
+so a regression points at its cause.
+
+Run from backend/:
+    python -m app.check_import_time --budget-ms 3000
+"""
+import argparse
+import re
+import subprocess
+import sys
+
+# Loaded lazily by embedding_backends / llm.import_llm_sdk, never at import time
+HEAVY_MODULES = ["torch", "sentence_transformers", "transformers", "onnxruntime", "tokenizers", "anthropic", "openai"]
+
+PROBE = (
+    "import sys, time\n"
+    "started = time.perf_counter()\n"
+    "import {module}\n"
+    "print(time.perf_counter() - started)\n"
+    "print(','.join(sorted(sys.modules)))\n"
+)
+IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def interpreter_modules() -> set:
+    """Modules a bare interpreter imports at startup, left out of the listing."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True)
+    return {m.group(4) for m in IMPORTTIME.finditer(result.stderr)}
+
+
+def measure(module: str):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.strip().splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(errors[-1] if errors else f"exit status {result.returncode}")
+    seconds, modules = result.stdout.strip().splitlines()[-2:]
+    # (cumulative us, nesting depth, module) for every import
+    imports = [(int(m.group(2)), len(m.group(3)) // 2, m.group(4)) for m in IMPORTTIME.finditer(result.stderr)]
+    return float(seconds) * 1000, set(modules.split(",")), imports
+
+
+def check(args) -> int:
+    try:
+        runs = [measure(args.module) for _ in range(args.runs)]
+    except RuntimeError as e:
+        print(f"[FAIL] import {args.module} failed: {e}")
+        return 1
+    elapsed_ms, modules, imports = min(runs, key=lambda run: run[0])
+    startup = interpreter_modules()
+
+    print(f"import {args.module}: best {elapsed_ms:.0f} ms of {args.runs} "
+          f"(all: {', '.join(f'{run[0]:.0f}' for run in runs)}), {len(modules)} modules")
+    # Slowest direct dependencies of the import, with nested ones folded in
+    top_level = sorted((i for i in imports if i[1] <= args.depth and i[2] not in startup), reverse=True)[:args.top]
+    for cumulative_us, depth, name in top_level:
+        print(f"  {cumulative_us / 1000:>8.1f} ms  {'  ' * depth}{name}")
+
+    failures = 0
+    heavy = [name for name in HEAVY_MODULES if name in modules]
+    if heavy:
+        failures += 1
+        print(f"[FAIL] imported at startup: {', '.join(heavy)}")
+    if elapsed_ms > args.budget_ms:
+        failures += 1
+        print(f"[FAIL] {elapsed_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    if not failures:
+        print(f"[ok] no heavy modules, within the {args.budget_ms:.0f} ms budget")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=3000)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--depth", type=int, default=1, help="Nesting depth of imports to list")
+    sys.exit(check(parser.parse_args()))
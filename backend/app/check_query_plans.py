@@ -0,0 +1,186 @@
+"""EXPLAIN every hot MemoryManager / API query against a seeded dataset.
+
+Seeds a large synthetic dataset inside one transaction, runs each query through
+a session that EXPLAINs every statement before executing it, then rolls the
+whole transaction back. Exits non-zero if any plan falls back to a sequential
+scan on one of the seeded tables, or if a query fails. get_turn_context runs
+both cold and with the user loaded into the vector cache.
+
+Run from backend/ against a local Postgres with pgvector and the latest migrations:
+    python -m app.check_query_plans --memories 50000
+"""
+import argparse
+import asyncio
+import random
+import re
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app import main
+from app.database import AsyncSessionLocal
+from app.memory import MemoryManager
+from app.services import load_history
+from app.srs import due_counts, due_queue
+from app.vector_cache import vector_cache
+
+SEEDED_TABLES = {"users", "conversations", "messages", "memories", "concept_progress"}
+SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+
+class ExplainSession:
+    """Wraps an AsyncSession so every statement is EXPLAINed before it runs.
+
+    commit() only flushes, keeping the seed transaction open for the final rollback.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.label = None
+        self.plans = []
+
+    async def execute(self, statement, *args, **kwargs):
+        result = await self.session.execute(Explain(statement), *args, **kwargs)
+        self.plans.append((self.label, "\n".join(row[0] for row in result)))
+        return await self.session.execute(statement, *args, **kwargs)
+
+    async def commit(self):
+        await self.session.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+class SeededMemoryManager(MemoryManager):
+    """MemoryManager with random query vectors, so no model is needed to plan searches."""
+
+    async def get_embedding(self, text: str):
+        return [random.uniform(-0.5, 0.5) for _ in range(384)]
+
+
+async def seed(session, users: int, conversations: int, messages: int, memories: int, concepts: int):
+    await session.execute(text(
+        "INSERT INTO users (username, xp, streak_days) "
+        "SELECT 'plan_check_' || g, 0, 0 FROM generate_series(1, :n) g"
+    ), {"n": users})
+    first_user = (await session.execute(text(
+        "SELECT min(id) FROM users WHERE username LIKE 'plan_check_%'"
+    ))).scalar()
+
+    await session.execute(text(
+        "INSERT INTO conversations (user_id, title, is_guest_mode, message_count) "
+        "SELECT :first_user + (g % :users), 'Plan check ' || g, 0, 0 FROM generate_series(1, :n) g"
+    ), {"first_user": first_user, "users": users, "n": conversations})
+    first_conv = (await session.execute(text(
+        "SELECT min(id) FROM conversations WHERE title LIKE 'Plan check %'"
+    ))).scalar()
+
+    await session.execute(text(
+        "INSERT INTO messages (conversation_id, role, content, created_at) "
+        "SELECT :first_conv + (g % :conversations), "
+        "       CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END, "
+        "       md5(g::text), now() - g * interval '1 second' "
+        "FROM generate_series(1, :n) g"
+    ), {"first_conv": first_conv, "conversations": conversations, "n": messages})
+
+    # The correlated `g * 0` forces a fresh random vector per row
+    await session.execute(text(
+        "INSERT INTO memories (user_id, content, embedding, metadata_, created_at) "
+        "SELECT :first_user + (g % :users), 'memory ' || g, "
+        "       (SELECT array_agg(random() - 0.5 + g * 0) FROM generate_series(1, 384))::vector, "
+        "       json_build_object("
+        "           'category', (ARRAY['user_profile', 'general', 'learning_preference'])[1 + g % 3]), "
+        "       now() - g * interval '1 minute' "
+        "FROM generate_series(1, :n) g"
+    ), {"first_user": first_user, "users": users, "n": memories})
+
+    await session.execute(text(
+        "INSERT INTO concept_progress (user_id, concept_key, concept, state, performance, "
+        "                              last_reviewed_at, next_review_at, review_count, updated_at) "
+        "SELECT :first_user + (g % :users), 'concept ' || g, 'Concept ' || g, 'practicing', 'medium', "
+        "       now() - interval '3 days', now() + ((g % 30) - 15) * interval '1 day', 1 + g % 5, "
+        "       now() - g * interval '1 minute' "
+        "FROM generate_series(1, :n) g"
+    ), {"first_user": first_user, "users": users, "n": concepts})
+
+    await session.execute(text("ANALYZE users, conversations, messages, memories, concept_progress"))
+    return first_user, first_conv
+
+
+async def check(args) -> int:
+    async with AsyncSessionLocal() as session:
+        print("Seeding...")
+        user_id, conversation_id = await seed(
+            session, args.users, args.conversations, args.messages, args.memories, args.concepts
+        )
+
+        db = ExplainSession(session)
+        memory = SeededMemoryManager(db)
+        # The cold get_turn_context below loads the user into the vector cache, so the
+        # following ones take the warm path (semantic matches served in-process)
+        vector_cache.enabled = True
+        checks = [
+            ("MemoryManager.search_memory", lambda: memory.search_memory("python loops", user_id)),
+            ("MemoryManager.get_turn_context", lambda: memory.get_turn_context("python loops", user_id)),
+            ("MemoryManager.get_turn_context (warm)", lambda: memory.get_turn_context("python loops", user_id)),
+            ("MemoryManager.get_turn_context (warm, cached digest)",
+             lambda: memory.get_turn_context("python loops", user_id, include_digest=False)),
+            ("MemoryManager.get_memories_by_category", lambda: memory.get_memories_by_category("user_profile", user_id)),
+            ("MemoryManager.get_due_learning_items", lambda: memory.get_due_learning_items(user_id)),
+            ("MemoryManager.get_all_memories", lambda: memory.get_all_memories(user_id)),
+            ("srs.due_queue", lambda: due_queue(db, user_id)),
+            ("srs.due_counts", lambda: due_counts(db, list(range(user_id, user_id + 100)))),
+            ("services.load_history", lambda: load_history(db, conversation_id)),
+            ("GET /conversations", lambda: main.list_conversations(user_id=user_id, db=db)),
+            ("GET /conversations/{id}/messages", lambda: main.get_messages(conversation_id, db=db)),
+            ("GET /users/{id}/stats", lambda: main.get_user_stats(user_id, db=db)),
+            # Destructive checks last; everything is rolled back below
+            ("DELETE /memories", lambda: memory.delete_all_memories(user_id)),
+            ("DELETE /conversations", lambda: main.delete_all_conversations(user_id=user_id, db=db)),
+        ]
+        # GET /users is excluded: it returns every user by design.
+
+        for label, run in checks:
+            db.label = label
+            await run()
+
+        await session.rollback()
+
+    failures = 0
+    if not vector_cache.hits:
+        failures += 1
+        print("[FAIL] get_turn_context never took the warm vector cache path")
+    for label, plan in db.plans:
+        scanned = SEEDED_TABLES.intersection(SEQ_SCAN.findall(plan))
+        status = "FAIL" if scanned else "ok"
+        print(f"[{status}] {label}: {plan.splitlines()[0].strip()}")
+        if scanned:
+            failures += 1
+            print("\n".join(f"        {line}" for line in plan.splitlines()))
+
+    print(f"\n{len(db.plans)} statements checked, {failures} sequential scan(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--conversations", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--memories", type=int, default=50000)
+    parser.add_argument("--concepts", type=int, default=20000)
+    sys.exit(asyncio.run(check(parser.parse_args())))
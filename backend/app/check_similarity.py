@@ -1,12 +1,15 @@
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import util
+from app.embeddings import embedding_service
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+def encode(text):
+    # Cache-aware: with EMBEDDING_CACHE_PATH set, the fixed memory is only encoded once
+    return embedding_service.encode_cached([text])[0]
 
 query = "who am i?"
 memory = "Aarohan is a 4th semester BSCS undergrad doing a NestJS + NextJS internship for fullstack development, but doesn't know JavaScript that well. He's asking for a rough rundown since he's only worked with these frameworks for a few weeks and may have missed some things."
 
-query_embedding = model.encode(query)
-memory_embedding = model.encode(memory)
+query_embedding = encode(query)
+memory_embedding = encode(memory)
 
 # Compute cosine similarity
 similarity = util.cos_sim(query_embedding, memory_embedding)
@@ -1,6 +1,9 @@
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import util
+from app.embeddings import embedding_service
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+def encode(text):
+    # Cache-aware: with EMBEDDING_CACHE_PATH set, the fixed memory is only encoded once
+    return embedding_service.encode_cached([text])[0]
 
 memory = "Aarohan is a 4th semester BSCS undergrad doing a NestJS + NextJS internship for fullstack development, but doesn't know JavaScript that well. He's asking for a rough rundown since he's only worked with these frameworks for a few weeks and may have missed some things."
 
@@ -11,9 +14,9 @@ queries = [
     "who am i? stored memory about user",
 ]
 
-memory_embedding = model.encode(memory)
+memory_embedding = encode(memory)
 
 for q in queries:
-    q_embedding = model.encode(q)
+    q_embedding = encode(q)
     sim = util.cos_sim(q_embedding, memory_embedding)
     print(f"Query: '{q}' -> Similarity: {sim.item():.4f}")
@@ -0,0 +1,83 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+# Rendered digests are rebuilt after this long even without a local write, which
+# bounds staleness when several worker processes serve the same user
+CONTEXT_DIGEST_TTL_SECONDS = float(os.getenv("CONTEXT_DIGEST_TTL_SECONDS", "120"))
+CONTEXT_DIGEST_MAX_USERS = int(os.getenv("CONTEXT_DIGEST_MAX_USERS", "10000"))
+
+
+def render_digest(context) -> str:
+    """PROFILE and LEARNING PROGRESS prompt sections from a TurnContext."""
+    digest = "PROFILE:\n" + "\n".join([f"- {m.content}" for m in context.profile])
+    digest += "\n\nLEARNING PROGRESS:\n" + "\n".join([f"- {m.content} (State: {m.state or 'Unknown'})" for m in context.learning])
+    return digest
+
+
+@dataclass
+class Digest:
+    version: int
+    text: str
+    built_at: float
+
+
+class ContextDigestCache:
+    """Per-user pre-rendered PROFILE / LEARNING PROGRESS prompt sections.
+
+    Every committed write to a user's memories or concept progress bumps the
+    user's version. A digest is only served if it was built at the current
+    version, so callers read the version *before* querying and store the digest
+    under it: a write that commits mid-build leaves the digest already stale.
+    """
+
+    def __init__(self, ttl_seconds: float = CONTEXT_DIGEST_TTL_SECONDS, max_users: int = CONTEXT_DIGEST_MAX_USERS):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._versions: Dict[int, int] = {}
+        self._digests: Dict[int, Digest] = {}
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.bumps = 0
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, 0)
+
+    def bump(self, user_id: int):
+        """Call after a write to the user's memories or concept progress has committed."""
+        self._versions[user_id] = self.version(user_id) + 1
+        self._digests.pop(user_id, None)
+        self.bumps += 1
+
+    def get(self, user_id: int) -> Optional[str]:
+        digest = self._digests.get(user_id)
+        if (digest is None or digest.version != self.version(user_id)
+                or time.monotonic() - digest.built_at > self.ttl_seconds):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return digest.text
+
+    def put(self, user_id: int, version: int, text: str):
+        if version != self.version(user_id):
+            return
+        if len(self._digests) >= self.max_users and user_id not in self._digests:
+            # Oldest insertion first
+            self._digests.pop(next(iter(self._digests)))
+        self._digests[user_id] = Digest(version=version, text=text, built_at=time.monotonic())
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._digests),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "bumps": self.bumps,
+        }
+
+
+context_digests = ContextDigestCache()
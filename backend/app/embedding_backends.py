@@ -0,0 +1,207 @@
+from abc import ABC, abstractmethod
+import json
+import os
+import threading
+import time
+from typing import List
+
+import numpy as np
+
+# "sentence-transformers" (PyTorch) or "onnx" (ONNX Runtime, no torch needed)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# Directory written by `python -m app.export_onnx_model`
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "models/all-MiniLM-L6-v2-onnx")
+# Use the int8 dynamically quantized graph: faster on CPU, slightly lower fidelity
+EMBEDDING_ONNX_QUANTIZE = os.getenv("EMBEDDING_ONNX_QUANTIZE", "0") == "1"
+EMBEDDING_ONNX_BATCH_SIZE = int(os.getenv("EMBEDDING_ONNX_BATCH_SIZE", "32"))
+# Intra-op threads used by encode; 0 keeps the runtime's default (all cores)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", os.getenv("EMBEDDING_TORCH_THREADS", "0")))
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_MODEL_FILE = "model_int8.onnx"
+ONNX_TOKENIZER_FILE = "tokenizer.json"
+ONNX_CONFIG_FILE = "embedding_config.json"
+
+
+class EmbeddingBackend(ABC):
+    """Turns a batch of texts into float32 sentence embeddings.
+
+    Constructing a backend is cheap: the runtime is imported and the weights
+    are read by `load()`, which `encode` calls on first use. `encode` is only
+    ever called from the embedding worker thread (or a maintenance script), so
+    `_encode` implementations need not be thread safe.
+    """
+
+    name = "base"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.loaded = False
+        self.load_seconds = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def cache_key(self) -> str:
+        """Embedding cache namespace; backends that produce different vectors must not share one."""
+        return f"{self.model_name}:{self.name}"
+
+    def load(self):
+        """Import the runtime and read the weights; safe to call repeatedly and from any thread."""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if self.loaded:
+                return
+            started = time.perf_counter()
+            self._load()
+            self.load_seconds = time.perf_counter() - started
+            self.loaded = True
+        print(f"[DEBUG] Loaded {self.name} embedding backend in {self.load_seconds:.1f}s")
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        self.load()
+        return self._encode(texts)
+
+    @abstractmethod
+    def _load(self):
+        """Import the runtime and read the weights; called once, under the load lock."""
+        pass
+
+    @abstractmethod
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode a batch into an (n, dim) float32 array; the backend is loaded."""
+        pass
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """The reference implementation: sentence-transformers on PyTorch."""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, threads: int = EMBEDDING_THREADS):
+        super().__init__(model_name)
+        self.threads = threads
+        self.model = None
+
+    @property
+    def cache_key(self) -> str:
+        # Unqualified, so caches written before backends were pluggable stay valid
+        return self.model_name
+
+    def _load(self):
+        if self.threads > 0:
+            import torch
+            torch.set_num_threads(self.threads)
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(self.model_name)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts), dtype=np.float32)
+
+
+class OnnxBackend(EmbeddingBackend):
+    """The same transformer exported to ONNX, run with ONNX Runtime on CPU.
+
+    Tokenization uses the exported fast tokenizer, and mean pooling plus L2
+    normalization are done here in numpy, matching the sentence-transformers
+    pipeline of all-MiniLM-L6-v2. Texts are sorted by length before batching
+    so each batch pads to a similar length.
+
+    The export directory is only read by `load()`; `model_name` (which keys
+    the embedding cache) must be the model the directory was exported from.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_dir: str = EMBEDDING_ONNX_DIR, quantize: bool = EMBEDDING_ONNX_QUANTIZE,
+                 threads: int = EMBEDDING_THREADS, batch_size: int = EMBEDDING_ONNX_BATCH_SIZE,
+                 model_name: str = EMBEDDING_MODEL_NAME):
+        super().__init__(model_name)
+        self.model_dir = model_dir
+        self.model_path = os.path.join(model_dir, ONNX_QUANTIZED_MODEL_FILE if quantize else ONNX_MODEL_FILE)
+        self.quantize = quantize
+        self.threads = threads
+        self.batch_size = batch_size
+        if quantize:
+            self.name = "onnx-int8"
+        self.config = None
+        self.session = None
+        self.tokenizer = None
+
+    def _load(self):
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(
+                f"{self.model_path} not found; export it with `python -m app.export_onnx_model --output {self.model_dir}`"
+            )
+        # Small JSON written by the exporter
+        with open(os.path.join(self.model_dir, ONNX_CONFIG_FILE)) as f:
+            config = json.load(f)
+        # Compared by basename: "sentence-transformers/all-MiniLM-L6-v2" is "all-MiniLM-L6-v2"
+        if os.path.basename(config["model"].rstrip("/")) != os.path.basename(self.model_name.rstrip("/")):
+            raise ValueError(
+                f"{self.model_dir} was exported from {config['model']!r} but EMBEDDING_MODEL is {self.model_name!r}; "
+                f"vectors would be cached under the wrong model"
+            )
+        self.config = config
+        self.normalize = config["normalize"]
+
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads > 0:
+            options.intra_op_num_threads = self.threads
+        self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, ONNX_TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": attention_mask,
+        }
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        token_embeddings = self.session.run(["last_hidden_state"], feeds)[0]
+
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.normalize:
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.astype(np.float32)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        order = np.argsort([len(text) for text in texts])
+        vectors = None
+        for start in range(0, len(texts), self.batch_size):
+            chunk = order[start:start + self.batch_size]
+            encoded = self._encode_batch([texts[i] for i in chunk])
+            if vectors is None:
+                vectors = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+            vectors[chunk] = encoded
+        return vectors
+
+
+BACKENDS = {
+    "sentence-transformers": SentenceTransformerBackend,
+    "onnx": OnnxBackend,
+}
+
+
+def load_backend(name: str = EMBEDDING_BACKEND, **options) -> EmbeddingBackend:
+    """Instantiate a backend by name; `options` are passed to its constructor.
+
+    The weights are not read until the first encode (or an explicit `load()`).
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {name!r}; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](**options)
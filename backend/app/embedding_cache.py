@@ -0,0 +1,149 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+# Optional sqlite file for the persistent tier; empty disables it
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")
+# sqlite's default limit on bound parameters is 999 on older builds
+_SQLITE_MAX_KEYS = 500
+
+
+class EmbeddingCache:
+    """Content-hash keyed embedding cache.
+
+    A bounded in-memory LRU sits in front of an optional sqlite file keyed by
+    (model name, sha256 of the text). Both tiers hold packed float32 (about
+    1.5 KB per 384-d vector rather than ~12 KB as a list of floats), which is
+    lossless for MiniLM output.
+
+    get() and put() only touch memory and are safe on the event loop. The
+    sqlite tier is blocking I/O: get_persisted() and write_persisted() must run
+    on the embedding worker thread, and puts are written in one transaction
+    per write_persisted() call rather than one commit each.
+    """
+
+    def __init__(self, model_name: str, max_size: int = EMBEDDING_CACHE_SIZE, path: str = EMBEDDING_CACHE_PATH):
+        self.model_name = model_name
+        self.max_size = max_size
+        self.path = path or None
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # Put but not yet written to sqlite
+        self._unwritten: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self._db = None
+
+        if self.path:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+            self._db.commit()
+
+        # Stats
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_writes = 0
+
+    @property
+    def persistent(self) -> bool:
+        return self._db is not None
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """Memory tier only. With a sqlite tier, misses are counted by get_persisted()."""
+        key = self._key(text)
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                if self._db is None:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return vector.tolist()
+
+    def get_persisted(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Look up memory-tier misses in sqlite. Blocking; run on the embedding worker thread."""
+        if self._db is None:
+            return [None] * len(texts)
+        keys = [self._key(text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_MAX_KEYS):
+                chunk = keys[start:start + _SQLITE_MAX_KEYS]
+                found.update(self._db.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    (self.model_name, *chunk)
+                ).fetchall())
+            vectors = []
+            for key in keys:
+                packed = found.get(key)
+                if packed is None:
+                    self.misses += 1
+                    vectors.append(None)
+                    continue
+                vector = np.frombuffer(packed, dtype=np.float32)
+                self._remember(key, vector)
+                self.disk_hits += 1
+                vectors.append(vector.tolist())
+        return vectors
+
+    def put(self, text: str, vector: List[float]):
+        key = self._key(text)
+        packed = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, packed)
+            if self._db is not None:
+                self._unwritten[key] = packed
+
+    def write_persisted(self):
+        """Write pending puts to sqlite in one transaction. Blocking; run on the embedding worker thread."""
+        with self._lock:
+            if self._db is None or not self._unwritten:
+                return
+            rows = [(self.model_name, key, vector.tobytes()) for key, vector in self._unwritten.items()]
+            self._unwritten.clear()
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)", rows
+                )
+                self._db.commit()
+                self.disk_writes += len(rows)
+            except sqlite3.Error as e:
+                # The memory tier still has them; losing the disk copy only costs a re-encode later
+                print(f"[DEBUG] Embedding cache write failed: {e}")
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "bytes": sum(vector.nbytes for vector in self._entries.values()),
+            "persistent": self._db is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "disk_writes": self.disk_writes,
+            "unwritten": len(self._unwritten),
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0,
+        }
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .embedding_backends import EmbeddingBackend, load_backend
+from .embedding_cache import EmbeddingCache
+
+# How long the batcher waits for more requests after the first one arrives
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+
+
+class EmbeddingService:
+    """Runs the configured EmbeddingBackend off the event loop.
+
+    Concurrent embed() calls are queued and coalesced into a single batched
+    encode call if they arrive within `batch_window_ms` of each other. Encoding
+    happens on a dedicated worker thread so async handlers never block on it.
+    Texts already in the embedding cache skip the model entirely, and a text
+    already queued or being encoded for another caller shares that caller's
+    result, so a batch never encodes the same string twice. The model itself
+    is only loaded on the first cache miss (or by warm_up()).
+    """
+
+    def __init__(self, backend: Optional[EmbeddingBackend] = None,
+                 batch_window_ms: float = EMBEDDING_BATCH_WINDOW_MS,
+                 max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE):
+        self.backend = backend or load_backend()
+        self.model_name = self.backend.model_name
+        self.cache = EmbeddingCache(self.backend.cache_key)
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+
+        self._queue: asyncio.Queue = None
+        # Text -> future for every text queued or being encoded
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._worker: asyncio.Task = None
+        self._loop = None
+
+        # Stats
+        self.requests = 0
+        self.batches = 0
+        self.embedded = 0
+        self.shared = 0
+        self.max_batch_seen = 0
+        self.encode_seconds = 0.0
+
+    def encode(self, texts: List[str]) -> List[List[float]]:
+        """Synchronous batched encode with no caching. Runs on the worker thread."""
+        return self.backend.encode(texts).tolist()
+
+    async def warm_up(self):
+        """Load the model and run one encode on the worker thread, off the event loop."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.encode, ["warm up"])
+
+    def encode_cached(self, texts: List[str]) -> List[List[float]]:
+        """Synchronous, cache-aware encode for maintenance scripts."""
+        vectors = [self.cache.get(text) for text in texts]
+        misses = [i for i, vector in enumerate(vectors) if vector is None]
+        for i, vector in zip(misses, self.cache.get_persisted([texts[i] for i in misses])):
+            vectors[i] = vector
+        misses = [i for i in misses if vectors[i] is None]
+        if misses:
+            for i, vector in zip(misses, self.encode([texts[i] for i in misses])):
+                self.cache.put(texts[i], vector)
+                vectors[i] = vector
+            self.cache.write_persisted()
+        return vectors
+
+    async def embed(self, text: str) -> List[float]:
+        return (await self.embed_many([text]))[0]
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        self.requests += len(texts)
+        vectors = [self.cache.get(text) for text in texts]
+        misses = [i for i, vector in enumerate(vectors) if vector is None]
+        loop = asyncio.get_running_loop()
+        if misses and self.cache.persistent:
+            # sqlite is blocking disk I/O, so it runs on the worker thread too
+            persisted = await loop.run_in_executor(
+                self.executor, self.cache.get_persisted, [texts[i] for i in misses]
+            )
+            for i, vector in zip(misses, persisted):
+                vectors[i] = vector
+            misses = [i for i in misses if vectors[i] is None]
+        if not misses:
+            return vectors
+
+        self._ensure_worker()
+        futures = {}
+        for i in misses:
+            text = texts[i]
+            if text in futures:
+                continue
+            future = self._in_flight.get(text)
+            if future is not None:
+                self.shared += 1
+            else:
+                future = loop.create_future()
+                self._queue.put_nowait((text, future))
+                self._in_flight[text] = future
+            futures[text] = future
+        # Shielded: the futures may be shared, and one caller's cancellation must not fail the others
+        await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        for i in misses:
+            vectors[i] = futures[texts[i]].result()
+        return vectors
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._in_flight = {}
+            self._worker = loop.create_task(self._run())
+
+    async def _collect_batch(self) -> List[Tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            texts = [text for text, _ in batch]
+            started = time.perf_counter()
+            try:
+                vectors = await loop.run_in_executor(self.executor, self.encode, texts)
+            except Exception as e:
+                print(f"[DEBUG] Embedding batch failed: {e}")
+                for text, future in batch:
+                    self._in_flight.pop(text, None)
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.encode_seconds += time.perf_counter() - started
+            for text, vector in zip(texts, vectors):
+                self.cache.put(text, vector)
+            if self.cache.persistent:
+                # One sqlite transaction per batch, queued behind the next encode on the worker thread
+                loop.run_in_executor(self.executor, self.cache.write_persisted)
+            self.batches += 1
+            self.embedded += len(batch)
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            for (text, future), vector in zip(batch, vectors):
+                self._in_flight.pop(text, None)
+                if not future.done():
+                    future.set_result(vector)
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model_name,
+            "backend": self.backend.name,
+            "loaded": self.backend.loaded,
+            "load_seconds": round(self.backend.load_seconds, 2) if self.backend.loaded else None,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "requests": self.requests,
+            "shared": self.shared,
+            "batches": self.batches,
+            "avg_batch_size": round(self.embedded / self.batches, 2) if self.batches else 0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_encode_ms": round(self.encode_seconds / self.batches * 1000, 2) if self.batches else 0,
+        }
+
+
+# The model is loaded lazily; see EmbeddingService.warm_up
+embedding_service = EmbeddingService()
@@ -0,0 +1,109 @@
+"""Export the sentence-transformers embedding model to ONNX for the onnx backend.
+
+Writes model.onnx (float32), model_int8.onnx (int8 dynamic quantization of
+the same graph), tokenizer.json and embedding_config.json to --output, which
+is what OnnxBackend loads from EMBEDDING_ONNX_DIR. Only the transformer is
+exported; mean pooling and normalization run in numpy at inference time.
+
+Needs torch and sentence-transformers (requirements.txt) plus onnxruntime
+(requirements-onnx.txt) and onnx; the serving image then only needs requirements-onnx.txt.
+Run from backend/:
+    python -m app.export_onnx_model --output models/all-MiniLM-L6-v2-onnx
+"""
+import argparse
+import json
+import os
+import sys
+
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from sentence_transformers import SentenceTransformer
+from sentence_transformers.models import Normalize, Pooling, Transformer
+
+from app.embedding_backends import (
+    EMBEDDING_MODEL_NAME,
+    ONNX_CONFIG_FILE,
+    ONNX_MODEL_FILE,
+    ONNX_QUANTIZED_MODEL_FILE,
+)
+
+INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+
+
+class LastHiddenState(torch.nn.Module):
+    """Keyword-calls the transformer, whose positional argument order varies across versions."""
+
+    def __init__(self, model, input_names):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        return self.model(**dict(zip(self.input_names, inputs))).last_hidden_state
+
+
+def is_mean_pooling(pooling: Pooling) -> bool:
+    config = pooling.get_config_dict()
+    if "pooling_mode" in config:  # sentence-transformers >= 6
+        return config["pooling_mode"] == "mean"
+    return {key for key, on in config.items() if key.startswith("pooling_mode_") and on} == {"pooling_mode_mean_tokens"}
+
+
+def export(args) -> int:
+    model = SentenceTransformer(args.model, device="cpu")
+    modules = list(model)
+    if not isinstance(modules[0], Transformer):
+        print(f"{args.model}: expected a Transformer first module, got {type(modules[0]).__name__}")
+        return 1
+    pooling = next((m for m in modules if isinstance(m, Pooling)), None)
+    if pooling is None or not is_mean_pooling(pooling):
+        print(f"{args.model}: only mean pooling is supported by the onnx backend")
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+    tokenizer = model.tokenizer
+    dummy = tokenizer(["An example sentence to trace the graph."], return_tensors="pt")
+    input_names = [name for name in INPUT_NAMES if name in dummy]
+    transformer = LastHiddenState(modules[0].auto_model.eval(), input_names)
+
+    model_path = os.path.join(args.output, ONNX_MODEL_FILE)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(dummy[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=args.opset,
+            do_constant_folding=True,
+            dynamo=False,
+        )
+    print(f"Wrote {model_path} ({os.path.getsize(model_path) / 1e6:.1f} MB)")
+
+    quantized_path = os.path.join(args.output, ONNX_QUANTIZED_MODEL_FILE)
+    quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+    print(f"Wrote {quantized_path} ({os.path.getsize(quantized_path) / 1e6:.1f} MB)")
+
+    tokenizer.save_pretrained(args.output)
+    config = {
+        "model": args.model,
+        "max_seq_length": model.max_seq_length,
+        "normalize": any(isinstance(m, Normalize) for m in modules),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+    }
+    with open(os.path.join(args.output, ONNX_CONFIG_FILE), "w") as f:
+        json.dump(config, f, indent=2)
+    print(f"Wrote {ONNX_CONFIG_FILE}: {config}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    parser.add_argument("--output", default="models/all-MiniLM-L6-v2-onnx")
+    parser.add_argument("--opset", type=int, default=14)
+    sys.exit(export(parser.parse_args()))
@@ -0,0 +1,249 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+from sqlalchemy import select, update, func, case, and_, or_
+from .database import AsyncSessionLocal
+from .models import Job
+
+# Deferred LLM work (titles, rollover summaries) running at once per process
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# A claimed job is leased to its worker for this long, renewed while the handler runs.
+# If the worker dies, another one can claim the job once the lease lapses.
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+# Delay before the first retry of a failed job; doubles with each further attempt
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class JobQueue:
+    """Small in-process queue for deferred LLM tasks.
+
+    Jobs are persisted in the `jobs` table before they run, so work that was
+    pending or running when the process stopped is picked up again by start().
+    Handlers run as asyncio tasks, at most `concurrency` at a time, and each
+    job's outcome is written back to its row for GET /jobs/{id} polling.
+
+    Several processes can share the table: a job is claimed under FOR UPDATE
+    SKIP LOCKED and leased to one worker (locked_by / locked_until), and only
+    a pending job that is due (run_after) or a running one whose lease has
+    lapsed can be claimed. Failed attempts are retried with exponential backoff.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, concurrency: int = JOB_CONCURRENCY):
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.handlers: Dict[str, JobHandler] = {}
+        self._semaphore: asyncio.Semaphore = None
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+        # Stats
+        self.enqueued = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.resumed = 0
+        self.lost_leases = 0
+
+    def register(self, kind: str):
+        """Decorator registering the handler for a job kind."""
+        def decorator(handler: JobHandler) -> JobHandler:
+            self.handlers[kind] = handler
+            return handler
+        return decorator
+
+    async def start(self):
+        """Resume jobs left pending or running by a previous process.
+
+        Each is scheduled for when it becomes claimable: pending jobs at their
+        run_after, running ones when their lease lapses. A job another live
+        worker is still renewing fails the claim and is left to that worker.
+        """
+        # Seconds until claimable, by the database clock like the claim itself
+        due = case((Job.status == "running", Job.locked_until), else_=Job.run_after)
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(Job.id, func.coalesce(func.extract("epoch", due - func.now()), 0))
+                .where(Job.status.in_(["pending", "running"]))
+                .order_by(Job.id)
+            )
+            jobs = result.all()
+        for job_id, delay in jobs:
+            self._schedule(job_id, float(delay))
+        self.resumed += len(jobs)
+        if jobs:
+            print(f"[DEBUG] Resumed {len(jobs)} pending jobs")
+
+    async def stop(self):
+        """Cancel in-flight jobs and release their leases, so they resume as soon as a worker starts."""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        async with self.session_factory() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.locked_by == self.worker_id, Job.status == "running")
+                .values(status="pending", locked_by=None, locked_until=None, updated_at=func.now())
+            )
+            await db.commit()
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any]) -> int:
+        """Persist a job and schedule it. Returns the job id immediately."""
+        if kind not in self.handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        async with self.session_factory() as db:
+            job = Job(kind=kind, payload=payload, status="pending")
+            db.add(job)
+            await db.commit()
+        self.enqueued += 1
+        self._schedule(job.id)
+        return job.id
+
+    async def wait(self, job_id: int, timeout: float = None) -> Optional[Job]:
+        """Wait for a job scheduled in this process to finish, then return its row."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        # Follow retries: a failed attempt reschedules the job under a new task
+        while (task := self._tasks.get(job_id)) is not None and not task.done():
+            remaining = deadline - loop.time() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(asyncio.shield(task), remaining)
+            except asyncio.TimeoutError:
+                break
+            except Exception:
+                pass
+        async with self.session_factory() as db:
+            return await db.get(Job, job_id)
+
+    def _schedule(self, job_id: int, delay: float = 0):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        task = asyncio.create_task(self._run(job_id, delay))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda t: self._tasks.pop(job_id) if self._tasks.get(job_id) is t else None)
+
+    @staticmethod
+    def _lease():
+        """New lease expiry; computed by the database so workers' clocks don't matter."""
+        return func.now() + timedelta(seconds=JOB_LEASE_SECONDS)
+
+    async def _claim(self, job_id: int):
+        """Lease the job to this worker if it is due pending work or its lease has lapsed.
+
+        Returns (kind, payload, attempts), or None if it is not claimable (done,
+        backing off, or running under another worker's live lease).
+        """
+        claimable = (
+            select(Job.id)
+            .where(
+                Job.id == job_id,
+                or_(
+                    and_(Job.status == "pending", Job.run_after <= func.now()),
+                    and_(
+                        Job.status == "running",
+                        or_(Job.locked_until.is_(None), Job.locked_until < func.now()),
+                    ),
+                ),
+            )
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(Job)
+                .where(Job.id == claimable)
+                .values(
+                    status="running", attempts=Job.attempts + 1,
+                    locked_by=self.worker_id, locked_until=self._lease(), updated_at=func.now(),
+                )
+                .returning(Job.kind, Job.payload, Job.attempts)
+            )
+            claimed = result.first()
+            await db.commit()
+        return claimed
+
+    async def _renew_lease(self, job_id: int):
+        """Extend this worker's lease while the handler runs."""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(Job)
+                        .where(Job.id == job_id, Job.locked_by == self.worker_id)
+                        .values(locked_until=self._lease())
+                    )
+                    await db.commit()
+            except Exception as e:
+                # The lease is long enough to survive a missed renewal
+                print(f"[DEBUG] Failed to renew lease on job {job_id}: {e}")
+
+    async def _run(self, job_id: int, delay: float = 0):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        async with self._semaphore:
+            claimed = await self._claim(job_id)
+            if claimed is None:
+                return
+            kind, payload, attempts = claimed
+
+            # The handler runs with no session open; it opens its own short ones
+            renewer = asyncio.create_task(self._renew_lease(job_id))
+            try:
+                outcome = await self.handlers[kind](payload)
+                values = {"status": "done", "result": outcome or {}, "error": None}
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[DEBUG] Job {job_id} ({kind}) failed: {e}")
+                retry = attempts < JOB_MAX_ATTEMPTS
+                values = {"status": "pending" if retry else "failed", "error": str(e)}
+                if retry:
+                    backoff = JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+                    values["run_after"] = func.now() + timedelta(seconds=backoff)
+            finally:
+                renewer.cancel()
+
+            # Only the lease holder records the outcome; a worker that lost its
+            # lease (e.g. stalled past locked_until) leaves the job to the new holder
+            async with self.session_factory() as db:
+                result = await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.locked_by == self.worker_id)
+                    .values(locked_by=None, locked_until=None, updated_at=func.now(), **values)
+                )
+                await db.commit()
+            if not result.rowcount:
+                self.lost_leases += 1
+                print(f"[DEBUG] Job {job_id} ({kind}) lost its lease; outcome discarded")
+                return
+            if values["status"] == "done":
+                self.completed += 1
+            elif values["status"] == "failed":
+                self.failed += 1
+
+        if values["status"] == "pending":
+            self.retried += 1
+            self._schedule(job_id, backoff)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "in_flight": len(self._tasks),
+            "enqueued": self.enqueued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "resumed": self.resumed,
+            "lost_leases": self.lost_leases,
+        }
+
+
+job_queue = JobQueue()
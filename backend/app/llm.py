@@ -1,9 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 import os
 import json
-import anthropic
-import openai
+import importlib
 
 from dataclasses import dataclass, field
 
@@ -12,11 +11,88 @@ class LLMResponse:
     content: str
     tool_calls: List[Dict[str, Any]] = field(default_factory=list)
 
+@dataclass
+class LLMStreamEvent:
+    """A single event from LLMProvider.stream().
+
+    type is "text" for a content delta (in `text`) or "done" for the final,
+    fully assembled response (in `response`), which is always the last event.
+    """
+    type: str
+    text: str = ""
+    response: Optional[LLMResponse] = None
+
+# Connection pool / timeout settings shared by all provider clients
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+# One long-lived SDK client per (provider, api_key, base_url), so chat turns
+# reuse keep-alive connections instead of paying a new TLS handshake each time.
+_client_registry: Dict[Tuple[str, Optional[str], Optional[str]], Any] = {}
+
+def _build_http_client(sdk):
+    # Use the SDK's own httpx classes so the pool works whichever httpx package it bundles
+    limits_cls = type(sdk.DEFAULT_CONNECTION_LIMITS)
+    return sdk.DefaultAsyncHttpxClient(
+        limits=limits_cls(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=sdk.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+    )
+
+def import_llm_sdk(provider: str):
+    """Import a provider's SDK on first use, so processes that never call it don't pay the import."""
+    return importlib.import_module("anthropic" if provider == "claude" else "openai")
+
+def get_llm_client(provider: str, api_key: str = None, base_url: str = None):
+    """Return the shared SDK client for this provider/key/endpoint, creating it on first use."""
+    key = (provider, api_key, base_url)
+    client = _client_registry.get(key)
+    if client is None:
+        sdk = import_llm_sdk(provider)
+        client_cls = sdk.AsyncAnthropic if provider == "claude" else sdk.AsyncOpenAI
+        client = client_cls(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=sdk.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            max_retries=LLM_MAX_RETRIES,
+            http_client=_build_http_client(sdk),
+        )
+        _client_registry[key] = client
+    return client
+
+async def close_llm_clients():
+    """Close all pooled provider clients (called from the FastAPI lifespan on shutdown)."""
+    clients = list(_client_registry.values())
+    _client_registry.clear()
+    for client in clients:
+        try:
+            await client.close()
+        except Exception as e:
+            print(f"[DEBUG] Failed to close LLM client: {e}")
+
 class LLMProvider(ABC):
     @abstractmethod
-    async def generate(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None) -> LLMResponse:
+    async def generate(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None, tool_choice: str = None) -> LLMResponse:
+        """Run one completion. `tool_choice` names a tool the model must call; None lets it decide."""
         pass
 
+    async def stream(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None, tool_choice: str = None) -> AsyncIterator[LLMStreamEvent]:
+        """Stream text deltas as they arrive, then a final "done" event with the full response.
+
+        Default implementation falls back to a single generate() call.
+        """
+        response = await self.generate(messages, tools, tool_choice)
+        if response.content:
+            yield LLMStreamEvent(type="text", text=response.content)
+        yield LLMStreamEvent(type="done", response=response)
+
     @abstractmethod
     def format_tool_call_message(self, tool_calls: List[Dict[str, Any]], content: str = None) -> Dict[str, Any]:
         """Format the assistant's tool call message for the message history."""
@@ -29,35 +105,45 @@ class LLMProvider(ABC):
 
 class ClaudeProvider(LLMProvider):
     def __init__(self):
-        self.client = anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        self.client = get_llm_client("claude", api_key=os.getenv("ANTHROPIC_API_KEY"))
         self.model = "claude-3-haiku-20240307"
 
-    async def generate(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None) -> LLMResponse:
-        # Extract system message from messages list if present
-        system_message = "You are a helpful AI tutor."  # Default fallback
+    def _build_kwargs(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None, tool_choice: str = None) -> Dict[str, Any]:
+        # Extract system messages from messages list if present
+        system_blocks = []
         filtered_messages = []
         
         for m in messages:
             if m["role"] == "system":
-                system_message = m["content"]  # Use the actual system prompt from agent.py
+                system_blocks.append({"type": "text", "text": m["content"]})
             else:
                 filtered_messages.append(m)
         
+        if not system_blocks:
+            system_blocks.append({"type": "text", "text": "You are a helpful AI tutor."})  # Default fallback
+        # Cache breakpoint after the first system block (the static prefix from
+        # prompts.py): tools plus that block are read from Anthropic's prompt cache,
+        # later blocks (per-turn context) are sent uncached
+        if len(system_blocks) > 1:
+            system_blocks[0]["cache_control"] = {"type": "ephemeral"}
+        
         kwargs = {
             "model": self.model,
             "max_tokens": 4096,
             "messages": filtered_messages,
-            "system": system_message
+            "system": system_blocks
         }
         if tools:
             kwargs["tools"] = tools
+            if tool_choice:
+                kwargs["tool_choice"] = {"type": "tool", "name": tool_choice}
+        return kwargs
 
-        response = await self.client.messages.create(**kwargs)
-        
+    def _parse_message(self, message) -> LLMResponse:
         content = ""
         tool_calls = []
         
-        for block in response.content:
+        for block in message.content:
             if block.type == "text":
                 content += block.text
             elif block.type == "tool_use":
@@ -69,6 +155,17 @@ class ClaudeProvider(LLMProvider):
                 
         return LLMResponse(content=content, tool_calls=tool_calls)
 
+    async def generate(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None, tool_choice: str = None) -> LLMResponse:
+        response = await self.client.messages.create(**self._build_kwargs(messages, tools, tool_choice))
+        return self._parse_message(response)
+
+    async def stream(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None, tool_choice: str = None) -> AsyncIterator[LLMStreamEvent]:
+        async with self.client.messages.stream(**self._build_kwargs(messages, tools, tool_choice)) as stream:
+            async for text in stream.text_stream:
+                yield LLMStreamEvent(type="text", text=text)
+            final_message = await stream.get_final_message()
+        yield LLMStreamEvent(type="done", response=self._parse_message(final_message))
+
     def format_tool_call_message(self, tool_calls: List[Dict[str, Any]], content: str = None) -> Dict[str, Any]:
         # For Claude, the assistant message that initiates tools must contain the tool_use blocks
         # And potentially text blocks
@@ -96,24 +193,109 @@ class ClaudeProvider(LLMProvider):
             ]
         }
 
+# Claude-format tool lists converted to OpenAI format, keyed by list identity.
+# Tool lists are module-level constants, so each is converted once and the
+# same payload is reused on every call.
+_openai_tools_cache: Dict[int, Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]] = {}
+_OPENAI_TOOLS_CACHE_SIZE = 32
+
+def to_openai_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Convert Claude tool definitions to OpenAI function tools, memoized per list."""
+    cached = _openai_tools_cache.get(id(tools))
+    if cached is not None and cached[0] is tools:
+        return cached[1]
+
+    openai_tools = [
+        {
+            "type": "function",
+            "function": {
+                "name": tool["name"],
+                "description": tool.get("description", ""),
+                "parameters": tool.get("input_schema", {})
+            }
+        }
+        for tool in tools
+    ]
+    if len(_openai_tools_cache) >= _OPENAI_TOOLS_CACHE_SIZE:
+        _openai_tools_cache.pop(next(iter(_openai_tools_cache)))
+    # Keep a reference to the source list so its id cannot be reused while cached
+    _openai_tools_cache[id(tools)] = (tools, openai_tools)
+    return openai_tools
+
+def _openai_tool_choice(tool_choice: str = None):
+    if tool_choice:
+        return {"type": "function", "function": {"name": tool_choice}}
+    return "auto"
+
+def _merge_system_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Join consecutive system messages so the static prefix comes first and stays
+    byte-identical across turns, which is what server-side prefix caches key on."""
+    merged = []
+    for m in messages:
+        if m["role"] == "system" and merged and merged[-1]["role"] == "system":
+            merged[-1] = {"role": "system", "content": merged[-1]["content"] + "\n\n" + m["content"]}
+        else:
+            merged.append(m)
+    return merged
+
+async def _stream_openai_compatible(client, kwargs: Dict[str, Any]) -> AsyncIterator[LLMStreamEvent]:
+    """Stream a chat completion from an OpenAI-compatible API.
+
+    Text deltas are yielded immediately; tool call fragments are accumulated
+    by index and parsed once the stream ends.
+    """
+    content = ""
+    partial_tool_calls: Dict[int, Dict[str, str]] = {}
+
+    stream = await client.chat.completions.create(stream=True, **kwargs)
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content += delta.content
+            yield LLMStreamEvent(type="text", text=delta.content)
+        for tc in delta.tool_calls or []:
+            partial = partial_tool_calls.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+            if tc.id:
+                partial["id"] = tc.id
+            if tc.function and tc.function.name:
+                partial["name"] += tc.function.name
+            if tc.function and tc.function.arguments:
+                partial["arguments"] += tc.function.arguments
+
+    tool_calls = []
+    for index in sorted(partial_tool_calls):
+        partial = partial_tool_calls[index]
+        tool_calls.append({
+            "name": partial["name"],
+            "input": json.loads(partial["arguments"] or "{}"),
+            "id": partial["id"]
+        })
+
+    yield LLMStreamEvent(type="done", response=LLMResponse(content=content, tool_calls=tool_calls))
+
 class LocalProvider(LLMProvider):
     def __init__(self):
-        self.client = openai.AsyncOpenAI(
-            base_url=os.getenv("LOCAL_LLM_URL", "http://host.docker.internal:11434/v1"),
-            api_key="sk-dummy"
+        self.client = get_llm_client(
+            "local",
+            api_key="sk-dummy",
+            base_url=os.getenv("LOCAL_LLM_URL", "http://host.docker.internal:11434/v1")
         )
         self.model = "llama3" 
     
-    async def generate(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None) -> LLMResponse:
+    def _build_kwargs(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None, tool_choice: str = None) -> Dict[str, Any]:
         kwargs = {
             "model": self.model,
-            "messages": messages,
+            "messages": _merge_system_messages(messages),
         }
         if tools:
-            kwargs["tools"] = tools
-            kwargs["tool_choice"] = "auto"
+            kwargs["tools"] = to_openai_tools(tools)
+            kwargs["tool_choice"] = _openai_tool_choice(tool_choice)
+        return kwargs
 
-        response = await self.client.chat.completions.create(**kwargs)
+    async def generate(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None, tool_choice: str = None) -> LLMResponse:
+        response = await self.client.chat.completions.create(**self._build_kwargs(messages, tools, tool_choice))
         message = response.choices[0].message
         
         tool_calls = []
@@ -127,6 +309,10 @@ class LocalProvider(LLMProvider):
                 
         return LLMResponse(content=message.content or "", tool_calls=tool_calls)
 
+    async def stream(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None, tool_choice: str = None) -> AsyncIterator[LLMStreamEvent]:
+        async for event in _stream_openai_compatible(self.client, self._build_kwargs(messages, tools, tool_choice)):
+            yield event
+
     def format_tool_call_message(self, tool_calls: List[Dict[str, Any]], content: str = None) -> Dict[str, Any]:
         # OpenAI expects an assistant message with 'tool_calls' field and optional content
         return {
@@ -157,43 +343,28 @@ class GroqProvider(LLMProvider):
     """GROQ API provider - uses OpenAI-compatible format"""
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv("GROQ_API_KEY")
-        self.client = openai.AsyncOpenAI(
-            base_url="https://api.groq.com/openai/v1",
-            api_key=self.api_key
+        self.client = get_llm_client(
+            "groq",
+            api_key=self.api_key,
+            base_url="https://api.groq.com/openai/v1"
         )
         # GROQ models: llama-3.3-70b-versatile, llama-3.1-8b-instant, mixtral-8x7b-32768
         self.model = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
     
-    async def generate(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None) -> LLMResponse:
-        # Convert Claude-style system message to OpenAI format
-        processed_messages = []
-        for m in messages:
-            if m["role"] == "system":
-                processed_messages.append({"role": "system", "content": m["content"]})
-            else:
-                processed_messages.append(m)
-        
+    def _build_kwargs(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None, tool_choice: str = None) -> Dict[str, Any]:
         kwargs = {
             "model": self.model,
-            "messages": processed_messages,
+            "messages": _merge_system_messages(messages),
             "max_tokens": 4096,
         }
         if tools:
-            # Convert Claude tool format to OpenAI format
-            openai_tools = []
-            for tool in tools:
-                openai_tools.append({
-                    "type": "function",
-                    "function": {
-                        "name": tool["name"],
-                        "description": tool.get("description", ""),
-                        "parameters": tool.get("input_schema", {})
-                    }
-                })
-            kwargs["tools"] = openai_tools
-            kwargs["tool_choice"] = "auto"
+            # Convert Claude tool format to OpenAI format (memoized per tool list)
+            kwargs["tools"] = to_openai_tools(tools)
+            kwargs["tool_choice"] = _openai_tool_choice(tool_choice)
+        return kwargs
 
-        response = await self.client.chat.completions.create(**kwargs)
+    async def generate(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None, tool_choice: str = None) -> LLMResponse:
+        response = await self.client.chat.completions.create(**self._build_kwargs(messages, tools, tool_choice))
         message = response.choices[0].message
         
         tool_calls = []
@@ -207,6 +378,10 @@ class GroqProvider(LLMProvider):
                 
         return LLMResponse(content=message.content or "", tool_calls=tool_calls)
 
+    async def stream(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]] = None, tool_choice: str = None) -> AsyncIterator[LLMStreamEvent]:
+        async for event in _stream_openai_compatible(self.client, self._build_kwargs(messages, tools, tool_choice)):
+            yield event
+
     def format_tool_call_message(self, tool_calls: List[Dict[str, Any]], content: str = None) -> Dict[str, Any]:
         return {
             "role": "assistant",
@@ -1,21 +1,49 @@
 from fastapi import FastAPI, Depends, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, desc
 from contextlib import asynccontextmanager
-from .database import get_db, engine, Base
-from .agent import Agent
-from .models import Conversation, Message, User
-from .memory import MemoryManager
-from typing import List, Dict, Optional
+from .database import get_db, engine, Base, AsyncSessionLocal, get_pool_stats
+from .agent import Agent, get_agent_stats
+from .models import Conversation, Job, Message, Quiz, User
+from .memory import MemoryManager, get_dedupe_stats
+from .llm import close_llm_clients
+from .services import load_history
+from .quizzes import submit_answers
+from .srs import due_counts, due_queue
+from .quiz_worker import QUIZ_PREGEN_ENABLED, get_quiz_worker_stats, run_quiz_worker
+from .embeddings import embedding_service
+from .jobs import job_queue
+from .memory_writer import memory_writer
+from .vector_cache import vector_cache
+from .context_digest import context_digests
+from .warmup import get_readiness, start_warm_up
+from typing import List, Optional
+import asyncio
+import json
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Create tables
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    # Resume deferred LLM jobs (titles, rollover summaries) left over from the last run
+    await job_queue.start()
+    # Background review-quiz pre-generation
+    quiz_worker = asyncio.create_task(run_quiz_worker()) if QUIZ_PREGEN_ENABLED else None
+    # Load the embedding model and LLM SDK without holding up startup; /ready flips when done
+    warmup = start_warm_up()
     yield
-    # Shutdown: cleanup if needed
+    if warmup and not warmup.done():
+        warmup.cancel()
+    if quiz_worker:
+        quiz_worker.cancel()
+    await job_queue.stop()
+    # Write out buffered memory writes before the process exits
+    await memory_writer.drain()
+    # Shutdown: close pooled LLM provider connections
+    await close_llm_clients()
 
 app = FastAPI(title="Agentic AI Tutor", lifespan=lifespan)
 
@@ -101,22 +129,23 @@ async def list_conversations(user_id: int = 1, db: AsyncSession = Depends(get_db
 
 @app.get("/conversations/{conversation_id}/messages")
 async def get_messages(conversation_id: int, db: AsyncSession = Depends(get_db)):
-    stmt = select(Message).where(Message.conversation_id == conversation_id).order_by(Message.created_at)
-    result = await db.execute(stmt)
-    messages = result.scalars().all()
-    return [{"role": m.role, "content": m.content} for m in messages]
+    messages = await load_history(db, conversation_id)
+    return [{"role": role, "content": content} for role, content in messages]
 
 @app.post("/conversations/{conversation_id}/messages")
-async def send_message(conversation_id: int, request: ChatRequest, db: AsyncSession = Depends(get_db)):
-    # Get conversation to check guest mode and user_id
-    conv_stmt = select(Conversation).where(Conversation.id == conversation_id)
-    result = await db.execute(conv_stmt)
-    conversation = result.scalar_one_or_none()
+async def send_message(conversation_id: int, request: ChatRequest):
+    # Get conversation to check guest mode and user_id.
+    # Short-lived session: the agent opens its own units of work so no
+    # connection is held while waiting on the LLM.
+    async with AsyncSessionLocal() as db:
+        conv_stmt = select(Conversation).where(Conversation.id == conversation_id)
+        result = await db.execute(conv_stmt)
+        conversation = result.scalar_one_or_none()
     
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    agent = Agent(db, user_id=conversation.user_id)
+    agent = Agent(user_id=conversation.user_id)
     response_data = await agent.process_message(
         request.message, 
         conversation_id, 
@@ -125,6 +154,43 @@ async def send_message(conversation_id: int, request: ChatRequest, db: AsyncSess
     )
     return response_data
 
+@app.post("/conversations/{conversation_id}/messages/stream")
+async def stream_message(conversation_id: int, request: ChatRequest):
+    """Streaming variant of send_message using Server-Sent Events.
+
+    Emits `delta` events with text as it is generated, a `block` event for each
+    quiz/resources/cheatsheet once its tool finishes, and a `done` event with the
+    same payload send_message returns. On a conversation's first message the
+    stream stays open after `done` until the background title job sends `title`.
+    """
+    async with AsyncSessionLocal() as db:
+        conv_stmt = select(Conversation).where(Conversation.id == conversation_id)
+        result = await db.execute(conv_stmt)
+        conversation = result.scalar_one_or_none()
+    
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    async def event_stream():
+        agent = Agent(user_id=conversation.user_id)
+        try:
+            async for event in agent.stream_message(
+                request.message,
+                conversation_id,
+                conversation.user_id,
+                bool(conversation.is_guest_mode)
+            ):
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        except Exception as e:
+            print(f"[DEBUG] Streaming error: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 class UpdateConversationRequest(BaseModel):
     title: str
 
@@ -252,6 +318,77 @@ async def get_user_stats(user_id: int, db: AsyncSession = Depends(get_db)):
         "streak_days": streak
     }
 
+# ====== Quiz Endpoints ======
+
+class QuizAnswerItem(BaseModel):
+    question_index: int
+    answer: str
+    hint_used: bool = False
+
+class QuizAnswersRequest(BaseModel):
+    answers: List[QuizAnswerItem]
+    record_progress: bool = True  # Record an SRS review of the quiz concept once it is complete
+
+@app.post("/quizzes/{quiz_id}/answers")
+async def answer_quiz(quiz_id: int, request: QuizAnswersRequest, db: AsyncSession = Depends(get_db)):
+    """Grade quiz answers and award XP in one transaction, without an agent turn"""
+    quiz = await db.get(Quiz, quiz_id)
+    if not quiz:
+        raise HTTPException(status_code=404, detail="Quiz not found")
+    
+    try:
+        result = await submit_answers(db, quiz, [a.model_dump() for a in request.answers], request.record_progress)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await db.commit()
+    if result["completed"] and request.record_progress:
+        # The concept's learning progress changed
+        context_digests.bump(quiz.user_id)
+    return result
+
+# ====== Review (SRS) Endpoints ======
+
+class DueCountsRequest(BaseModel):
+    user_ids: List[int]
+
+@app.get("/users/{user_id}/reviews/due")
+async def get_due_reviews(user_id: int, limit: int = 20, db: AsyncSession = Depends(get_db)):
+    """Concepts due for review, soonest first"""
+    items = await due_queue(db, user_id, min(limit, 100))
+    return [{
+        "concept": c.concept,
+        "state": c.state,
+        "next_review_at": c.next_review_at,
+        "interval_days": c.interval_days,
+        "repetitions": c.repetitions,
+        "ease": round(c.ease, 2)
+    } for c in items]
+
+@app.post("/reviews/due-counts")
+async def get_due_counts(request: DueCountsRequest, db: AsyncSession = Depends(get_db)):
+    """Due review counts for many users in one query"""
+    if len(request.user_ids) > 1000:
+        raise HTTPException(status_code=400, detail="At most 1000 user_ids per request")
+    return {"counts": await due_counts(db, request.user_ids)}
+
+# ====== Job Endpoints ======
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    """Poll a deferred job (conversation title, rollover summary)"""
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at
+    }
+
 # ====== Model Settings Endpoints ======
 from .llm import get_user_llm_settings, set_user_llm_settings
 
@@ -281,6 +418,31 @@ async def update_model_settings(user_id: int, settings: ModelSettingsRequest):
     set_user_llm_settings(user_id, settings.provider, settings.api_key)
     return {"message": f"Switched to {settings.provider}", "provider": settings.provider}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Runtime performance counters"""
+    return {
+        "embedding": embedding_service.stats(),
+        "embedding_cache": embedding_service.cache.stats(),
+        "agent": get_agent_stats(),
+        "quiz_worker": get_quiz_worker_stats(),
+        "jobs": job_queue.stats(),
+        "memory_writes": memory_writer.stats(),
+        "memory_dedupe": get_dedupe_stats(),
+        "vector_cache": vector_cache.stats(),
+        "context_digest": context_digests.stats(),
+        "readiness": get_readiness(),
+        "db_pool": get_pool_stats()
+    }
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until the startup warm-up has loaded the models"""
+    readiness = get_readiness()
+    if not readiness["ready"]:
+        return JSONResponse(status_code=503, content=readiness)
+    return readiness
+
 @app.get("/")
 async def root():
     return {"message": "Agentic AI Tutor Backend Running"}
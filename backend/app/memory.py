@@ -1,40 +1,381 @@
-from sentence_transformers import SentenceTransformer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, func, text
-from datetime import datetime
-from .models import Memory
-import json
+from sqlalchemy import select, insert, update, delete, func, literal, cast, extract, union_all, Float, table, column
+from dataclasses import dataclass, field
+from typing import List, Optional
+from pgvector.sqlalchemy import Vector
+from .models import ConceptProgress, Memory, EMBEDDING_DIM, MEMORY_VECTOR_INDEX, MEMORY_VECTOR_STORAGE, memory_metadata
+from .embeddings import embedding_service
+from .srs import due_queue
+from .vector_cache import vector_cache
+from .context_digest import context_digests
+import os
+import numpy as np
 
-# Load model once
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+# Per-query ANN recall/speed knobs, applied transaction-locally before each vector search
+MEMORY_HNSW_EF_SEARCH = int(os.getenv("MEMORY_HNSW_EF_SEARCH", "40"))
+MEMORY_IVFFLAT_PROBES = int(os.getenv("MEMORY_IVFFLAT_PROBES", "10"))
+# Every search filters on user_id, but the ANN index covers all users: a plain index
+# scan stops after ef_search (or the probed lists') candidates and filters afterwards,
+# so a user can get fewer than k results, or none. pgvector >= 0.8 can keep scanning
+# until enough rows pass the filter. "auto" turns that on (relaxed_order) when the
+# server's pgvector supports it; "off", "relaxed_order" or "strict_order" (HNSW only) force it.
+MEMORY_HNSW_ITERATIVE_SCAN = os.getenv("MEMORY_HNSW_ITERATIVE_SCAN", "auto")
+# Binary storage: Hamming-distance candidates fetched per requested result before the exact rerank
+MEMORY_BINARY_RERANK_FACTOR = int(os.getenv("MEMORY_BINARY_RERANK_FACTOR", "10"))
+# A new memory at least this cosine-similar to one of the user's memories in the
+# same category refreshes that row instead of inserting; above 1 disables it
+MEMORY_DEDUPE_THRESHOLD = float(os.getenv("MEMORY_DEDUPE_THRESHOLD", "0.92"))
+
+# Near-duplicate suppression counters
+_dedupe_stats = {
+    "checked": 0,
+    "inserted": 0,
+    "merged": 0,  # refreshed an existing row
+    "merged_in_batch": 0,  # duplicate of an earlier item in the same add_memories batch
+}
+
+# MEMORY_HNSW_ITERATIVE_SCAN after "auto" is resolved against the server, once per process
+_iterative_scan_mode: Optional[str] = None
+
+def get_dedupe_stats() -> dict:
+    return {"threshold": MEMORY_DEDUPE_THRESHOLD, **_dedupe_stats}
+
+@dataclass
+class ContextMemory:
+    """Lightweight memory (or concept_progress) row used to build the prompt context."""
+    id: int
+    content: str
+    category: Optional[str] = None
+    state: Optional[str] = None
+    kind: str = "memory"  # "memory" or "concept"; ids are only unique per kind
+
+@dataclass
+class TurnContext:
+    """Everything the prompt builder needs from memory for one turn."""
+    relevant: List[ContextMemory] = field(default_factory=list)
+    profile: List[ContextMemory] = field(default_factory=list)
+    learning: List[ContextMemory] = field(default_factory=list)
+    due: List[ContextMemory] = field(default_factory=list)
+
+    @property
+    def unique(self) -> List[ContextMemory]:
+        """All retrieved memories, deduplicated by id in retrieval order."""
+        seen_ids = set()
+        unique_memories = []
+        for m in self.relevant + self.profile + self.learning + self.due:
+            if (m.kind, m.id) not in seen_ids:
+                unique_memories.append(m)
+                seen_ids.add((m.kind, m.id))
+        return unique_memories
+
+def _cached_row(memory_id: int, content: str, metadata: Optional[dict]):
+    """(id, content, category, state) as kept by the vector cache."""
+    metadata = metadata or {}
+    return (memory_id, content, metadata.get("category"), metadata.get("state"))
 
 class MemoryManager:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_embedding(self, text: str):
-        return embedding_model.encode(text).tolist()
+    async def get_embedding(self, text: str):
+        # Encoded on the embedding worker thread, batched with concurrent requests
+        return await embedding_service.embed(text)
 
-    async def add_memory(self, content: str, user_id: int, metadata: dict = None):
-        embedding = self.get_embedding(content)
-        memory = Memory(content=content, user_id=user_id, embedding=embedding, metadata_=metadata or {})
-        self.db.add(memory)
+    async def add_memory(self, content: str, user_id: int, metadata: dict = None) -> int:
+        """Insert a memory (or refresh a near-duplicate of it) and commit; returns its id.
+
+        The chat path buffers writes through memory_writer instead; this is for
+        one-off writes such as maintenance scripts.
+        """
+        written = await self.add_memories([{"content": content, "user_id": user_id, "metadata": metadata or {}}])
         await self.db.commit()
-        await self.db.refresh(memory)
-        return memory
+        self.apply_committed_writes(written)
+        return written[0][1][0]
+
+    async def add_memories(self, items: List[dict], embeddings: Optional[List[List[float]]] = None):
+        """Insert many memories with one batched encode and one multi-row INSERT.
+
+        Each item has content, user_id and optional metadata. Near-duplicates
+        (of each other, or of stored memories in the same category) refresh a
+        row instead of adding one. Stages in the caller's transaction; the
+        caller commits, then passes the returned (user_id, row, embedding)
+        list to apply_committed_writes.
+        """
+        if not items:
+            return []
+        if embeddings is None:
+            embeddings = await embedding_service.embed_many([item["content"] for item in items])
+
+        # Later items win within the batch: they are the most recent wording
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        kept = []
+        for i in reversed(range(len(items))):
+            category = (items[i].get("metadata") or {}).get("category")
+            if category and any(
+                items[j]["user_id"] == items[i]["user_id"]
+                and (items[j].get("metadata") or {}).get("category") == category
+                and float(vectors[i] @ vectors[j]) >= MEMORY_DEDUPE_THRESHOLD
+                for j in kept
+            ):
+                _dedupe_stats["merged_in_batch"] += 1
+                continue
+            kept.append(i)
+        kept.reverse()
+
+        rows, written = [], []
+        # Transaction-local search settings, set once for every lookup below
+        await self.apply_vector_search_settings()
+        for i in kept:
+            item, embedding = items[i], embeddings[i]
+            _dedupe_stats["checked"] += 1
+            duplicate_id = await self.find_duplicate(
+                item["user_id"], (item.get("metadata") or {}).get("category"), embedding, apply_settings=False
+            )
+            if duplicate_id is not None:
+                await self._refresh_memory(duplicate_id, item["content"], embedding)
+                written.append((item["user_id"], _cached_row(duplicate_id, item["content"], item.get("metadata")), embedding))
+                continue
+            rows.append({
+                "content": item["content"],
+                "user_id": item["user_id"],
+                "embedding": embedding,
+                "metadata_": item.get("metadata") or {},
+            })
+        if rows:
+            # Postgres returns multi-row VALUES ids in input order
+            ids = (await self.db.execute(insert(Memory).values(rows).returning(Memory.id))).scalars().all()
+            _dedupe_stats["inserted"] += len(rows)
+            written += [
+                (row["user_id"], _cached_row(memory_id, row["content"], row["metadata_"]), row["embedding"])
+                for memory_id, row in zip(ids, rows)
+            ]
+        return written
+
+    @staticmethod
+    def apply_committed_writes(written):
+        """Patch the vector cache and invalidate context digests for committed add_memories writes."""
+        for user_id, row, embedding in written:
+            vector_cache.patch(user_id, [row], [embedding])
+        for user_id in {user_id for user_id, _, _ in written}:
+            context_digests.bump(user_id)
+
+    async def find_duplicate(self, user_id: int, category: Optional[str], embedding: List[float],
+                             apply_settings: bool = True) -> Optional[int]:
+        """Id of the user's nearest memory in `category` if it is within the dedupe threshold."""
+        if not category or MEMORY_DEDUPE_THRESHOLD > 1:
+            return None
+        cached = vector_cache.get(user_id)
+        if cached is not None:
+            nearest = vector_cache.top_k(cached, embedding, 1, category=category)
+            if nearest and 1 - nearest[0][1] >= MEMORY_DEDUPE_THRESHOLD:
+                return nearest[0][0][0]
+            return None
+        distance = Memory.embedding.cosine_distance(embedding)
+        if apply_settings:
+            await self.apply_vector_search_settings()
+        criteria = (Memory.user_id == user_id, memory_metadata("category") == category)
+        row = (await self.db.execute(
+            select(Memory.id, distance.label("distance"))
+            .where(*criteria, *self.candidate_filter(embedding, 1, *criteria))
+            .order_by(distance)
+            .limit(1)
+        )).first()
+        if row is None or row.distance is None or 1 - row.distance < MEMORY_DEDUPE_THRESHOLD:
+            return None
+        return row.id
+
+    async def _refresh_memory(self, memory_id: int, content: str, embedding: List[float]) -> Memory:
+        """Merge a near-duplicate into an existing memory: newest wording, moved to the front."""
+        _dedupe_stats["merged"] += 1
+        result = await self.db.execute(
+            update(Memory)
+            .where(Memory.id == memory_id)
+            .values(content=content, embedding=embedding, created_at=func.now())
+            .returning(Memory)
+        )
+        return result.scalar_one()
+
+    def candidate_filter(self, query_embedding: List[float], limit: int, *criteria) -> list:
+        """Extra WHERE criteria for a cosine search under binary storage.
+
+        Restricts the search to the nearest rows by Hamming distance on the
+        bit-quantized index, so the exact cosine ORDER BY only reranks
+        `limit * MEMORY_BINARY_RERANK_FACTOR` candidates. Empty for the other modes.
+        """
+        if MEMORY_VECTOR_STORAGE != "binary":
+            return []
+        query_bits = func.binary_quantize(cast(query_embedding, Vector(EMBEDDING_DIM)))
+        candidates = (
+            select(Memory.id)
+            .where(*criteria)
+            .order_by(Memory.embedding_bits.hamming_distance(query_bits))
+            .limit(limit * MEMORY_BINARY_RERANK_FACTOR)
+        )
+        return [Memory.id.in_(candidates)]
+
+    async def iterative_scan_mode(self) -> str:
+        """MEMORY_HNSW_ITERATIVE_SCAN with "auto" resolved from the installed pgvector version."""
+        global _iterative_scan_mode
+        if _iterative_scan_mode is None:
+            mode = MEMORY_HNSW_ITERATIVE_SCAN
+            if mode == "auto":
+                extension = table("pg_extension", column("extname"), column("extversion"))
+                version = (await self.db.execute(
+                    select(extension.c.extversion).where(extension.c.extname == "vector")
+                )).scalar()
+                # Setting the parameter on an older pgvector is an error, not a no-op
+                supported = version is not None and tuple(int(part) for part in version.split(".")[:2]) >= (0, 8)
+                mode = "relaxed_order" if supported else "off"
+                if not supported:
+                    print(f"[DEBUG] pgvector {version} has no iterative index scans; "
+                          f"filtered memory searches may return fewer than k results")
+            _iterative_scan_mode = mode
+        return _iterative_scan_mode
+
+    async def apply_vector_search_settings(self):
+        """Set ANN search parameters for the current transaction (SET LOCAL semantics),
+        so they never leak to other users of the pooled connection."""
+        iterative_scan = await self.iterative_scan_mode()
+        if MEMORY_VECTOR_INDEX == "ivfflat":
+            settings = [func.set_config("ivfflat.probes", str(MEMORY_IVFFLAT_PROBES), True)]
+            if iterative_scan != "off":
+                # IVFFlat only supports relaxed ordering
+                settings.append(func.set_config("ivfflat.iterative_scan", "relaxed_order", True))
+        else:
+            ef_search = MEMORY_HNSW_EF_SEARCH
+            if MEMORY_VECTOR_STORAGE == "binary":
+                # An HNSW scan returns at most ef_search rows: leave room for a top-10's candidates
+                ef_search = max(ef_search, 10 * MEMORY_BINARY_RERANK_FACTOR)
+            settings = [func.set_config("hnsw.ef_search", str(ef_search), True)]
+            if iterative_scan != "off":
+                settings.append(func.set_config("hnsw.iterative_scan", iterative_scan, True))
+        # One round trip for all settings
+        await self.db.execute(select(*settings))
 
     async def search_memory(self, query: str, user_id: int, limit: int = 5):
-        query_embedding = self.get_embedding(query)
-        # pgvector l2_distance or cosine_distance
-        # Note: pgvector syntax might vary slightly by version, using l2_distance (<->)
-        stmt = select(Memory).where(Memory.user_id == user_id).order_by(Memory.embedding.l2_distance(query_embedding)).limit(limit)
+        query_embedding = await self.get_embedding(query)
+        cached = vector_cache.get(user_id)
+        if cached is not None:
+            # Warm user: rank in process, then fetch the winners by primary key
+            ids = [row[0] for row, _ in vector_cache.top_k(cached, query_embedding, limit)]
+            result = await self.db.execute(select(Memory).where(Memory.id.in_(ids)))
+            by_id = {m.id: m for m in result.scalars().all()}
+            return [by_id[i] for i in ids if i in by_id]
+        # Cosine distance (<=>) matches the cosine ANN index on memories.embedding
+        await self.apply_vector_search_settings()
+        distance = Memory.embedding.cosine_distance(query_embedding)
+        candidates = self.candidate_filter(query_embedding, limit, Memory.user_id == user_id)
+        # relaxed_order iterative scans can return the top k slightly out of order: re-sort outside the LIMIT
+        nearest = (
+            select(Memory.id, distance.label("distance"))
+            .where(Memory.user_id == user_id, *candidates)
+            .order_by(distance)
+            .limit(limit)
+            .subquery()
+        )
+        stmt = select(Memory).join(nearest, Memory.id == nearest.c.id).order_by(nearest.c.distance)
         result = await self.db.execute(stmt)
-        return result.scalars().all()
+        memories = result.scalars().all()
+        await self.warm_vector_cache(user_id)
+        return memories
+
+    async def warm_vector_cache(self, user_id: int):
+        """Load a cold user's embeddings into the vector cache (no-op when disabled)."""
+        if not vector_cache.should_load(user_id):
+            return
+        result = await self.db.execute(
+            select(Memory.id, Memory.content, memory_metadata("category"), memory_metadata("state"), Memory.embedding)
+            .where(Memory.user_id == user_id, Memory.embedding.is_not(None))
+            .limit(vector_cache.max_rows + 1)
+        )
+        rows = result.all()
+        vector_cache.load(user_id, [tuple(row[:4]) for row in rows], [row[4] for row in rows])
+
+    async def get_turn_context(self, query: str, user_id: int, limit: int = 5, category_limit: int = 10,
+                               query_embedding: List[float] = None, include_digest: bool = True) -> TurnContext:
+        """Fetch semantic matches, profile, learning progress and due review items in one statement.
+
+        Each result set is a branch of a UNION ALL tagged with a `source` column;
+        `sort_key` preserves the ordering each branch would have on its own.
+        Learning progress and due items come from concept_progress (one row per concept).
+        Pass `query_embedding` if it was computed before the session was opened, and
+        include_digest=False to skip the profile and learning branches when the
+        caller already has a current context digest for them.
+        """
+        if query_embedding is None:
+            query_embedding = await self.get_embedding(query)
+        # Warm users get semantic matches from the in-process vector cache
+        cached = vector_cache.get(user_id)
+        if cached is None:
+            await self.apply_vector_search_settings()
+
+        category = memory_metadata("category")
+
+        # A UNION takes its column names from the first branch, and which branch
+        # comes first depends on the cache and digest state: every branch labels
+        # its columns identically
+        def branch(source: str, sort_key, *criteria):
+            return select(
+                literal(source).label("source"),
+                Memory.id.label("id"),
+                Memory.content.label("content"),
+                category.label("category"),
+                memory_metadata("state").label("state"),
+                cast(sort_key, Float).label("sort_key"),
+            ).where(Memory.user_id == user_id, *criteria)
+
+        def concept_branch(source: str, sort_key, *criteria):
+            return select(
+                literal(source).label("source"),
+                ConceptProgress.id.label("id"),
+                ConceptProgress.concept.label("content"),
+                literal("learning_progress").label("category"),
+                ConceptProgress.state.label("state"),
+                cast(sort_key, Float).label("sort_key"),
+            ).where(ConceptProgress.user_id == user_id, *criteria)
+
+        distance = Memory.embedding.cosine_distance(query_embedding)
+        newest_first = -extract("epoch", Memory.created_at)
+        branches = [
+            concept_branch(
+                "due", extract("epoch", ConceptProgress.next_review_at),
+                ConceptProgress.next_review_at <= func.now()
+            ).order_by(ConceptProgress.next_review_at).limit(category_limit),
+        ]
+        if include_digest:
+            branches += [
+                branch("profile", newest_first, category == "user_profile")
+                    .order_by(Memory.created_at.desc()).limit(category_limit),
+                concept_branch("learning", -extract("epoch", ConceptProgress.updated_at))
+                    .order_by(ConceptProgress.updated_at.desc()).limit(category_limit),
+            ]
+        if cached is None:
+            candidates = self.candidate_filter(query_embedding, limit, Memory.user_id == user_id)
+            branches.insert(0, branch("relevant", distance, *candidates).order_by(distance).limit(limit))
+
+        tagged = union_all(*branches).subquery("turn_context")
+        result = await self.db.execute(select(tagged).order_by(tagged.c.source, tagged.c.sort_key))
+
+        context = TurnContext()
+        if cached is not None:
+            context.relevant = [
+                ContextMemory(id=memory_id, content=content, category=category_, state=state)
+                for (memory_id, content, category_, state), _ in vector_cache.top_k(cached, query_embedding, limit)
+            ]
+        for row in result.all():
+            getattr(context, row.source).append(ContextMemory(
+                id=row.id, content=row.content, category=row.category, state=row.state,
+                kind="concept" if row.source in ("learning", "due") else "memory"
+            ))
+        if cached is None:
+            await self.warm_vector_cache(user_id)
+        return context
 
     async def get_memories_by_category(self, category: str, user_id: int, limit: int = 10):
         stmt = select(Memory).where(
             Memory.user_id == user_id,
-            Memory.metadata_.op("->>")("category") == category
+            memory_metadata("category") == category
         ).order_by(Memory.created_at.desc()).limit(limit)
         result = await self.db.execute(stmt)
         return result.scalars().all()
@@ -46,21 +387,13 @@ class MemoryManager:
         return result.scalars().all()
     
     async def delete_all_memories(self, user_id: int):
-        """Delete all memories for a specific user"""
-        stmt = delete(Memory).where(Memory.user_id == user_id)
-        await self.db.execute(stmt)
+        """Delete all memories (and concept progress) for a specific user"""
+        await self.db.execute(delete(Memory).where(Memory.user_id == user_id))
+        await self.db.execute(delete(ConceptProgress).where(ConceptProgress.user_id == user_id))
         await self.db.commit()
+        vector_cache.invalidate(user_id)
+        context_digests.bump(user_id)
 
-    async def get_due_learning_items(self, user_id: int):
-        """Get learning progress items that are due for review"""
-        # We look for memories where metadata->'next_review_date' exists and is <= now()
-        # and category is 'learning_progress'
-        now_str = datetime.now().isoformat()
-        stmt = select(Memory).where(
-            Memory.user_id == user_id,
-            Memory.metadata_.op("->>")("category") == "learning_progress",
-            Memory.metadata_.op("->>")("next_review_date") <= now_str
-        ).order_by(Memory.metadata_.op("->>")("next_review_date"))
-        
-        result = await self.db.execute(stmt)
-        return result.scalars().all()
+    async def get_due_learning_items(self, user_id: int, limit: int = 20):
+        """Get concepts whose next review is due, soonest first"""
+        return await due_queue(self.db, user_id, limit)
@@ -0,0 +1,171 @@
+import asyncio
+import os
+import time
+from typing import List, Set
+from .database import AsyncSessionLocal
+from .embeddings import embedding_service
+from .memory import MemoryManager
+
+# Flush once this many writes are buffered...
+MEMORY_WRITE_BATCH_SIZE = int(os.getenv("MEMORY_WRITE_BATCH_SIZE", "32"))
+# ...or this long after the first buffered write, whichever comes first
+MEMORY_WRITE_FLUSH_MS = float(os.getenv("MEMORY_WRITE_FLUSH_MS", "200"))
+# "buffered": responses never wait on memory writes (a crash can lose up to one window).
+# "sync": a turn's writes are flushed before its response is sent.
+MEMORY_WRITE_DURABILITY = os.getenv("MEMORY_WRITE_DURABILITY", "buffered")
+
+
+class MemoryWriteBuffer:
+    """Write-behind buffer for memory inserts.
+
+    Tools submit writes and move on; the buffer embeds each batch with one
+    encode call and stores it with one multi-row INSERT and one commit. Every
+    submit returns a future that resolves to True once the write is stored
+    (False if the batch failed), so callers that need durability can wait.
+
+    A batch mixes different users' writes, so each batch is written by its own
+    task: cancelling whoever triggered the flush (a disconnected request in
+    settle(), the flusher at shutdown) never drops it.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal,
+                 batch_size: int = MEMORY_WRITE_BATCH_SIZE,
+                 flush_ms: float = MEMORY_WRITE_FLUSH_MS,
+                 durability: str = MEMORY_WRITE_DURABILITY):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.durability = durability
+
+        self._pending: List[tuple] = []
+        self._has_items: asyncio.Event = None
+        self._batch_full: asyncio.Event = None
+        self._flush_lock: asyncio.Lock = None
+        self._flusher: asyncio.Task = None
+        self._writes: Set[asyncio.Task] = set()
+        self._loop = None
+
+        # Stats
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+        self.flush_seconds = 0.0
+
+    def submit(self, content: str, user_id: int, metadata: dict = None) -> asyncio.Future:
+        """Buffer a memory write. Never blocks; the returned future resolves after it is stored."""
+        self._ensure_flusher()
+        future = self._loop.create_future()
+        self._pending.append(({"content": content, "user_id": user_id, "metadata": metadata or {}}, future))
+        self.submitted += 1
+        self._has_items.set()
+        if len(self._pending) >= self.batch_size:
+            self._batch_full.set()
+        return future
+
+    async def settle(self, futures: List[asyncio.Future]):
+        """Durability point before a response is sent: in "sync" mode, flush and
+        wait for `futures`; in "buffered" mode return immediately."""
+        if self.durability != "sync" or not futures:
+            return
+        await self.flush()
+        # Shielded so a cancelled turn leaves the futures for the write to resolve
+        await asyncio.shield(asyncio.gather(*futures))
+
+    async def flush(self):
+        """Write everything buffered so far in one batch."""
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            self._has_items.clear()
+            self._batch_full.clear()
+            if not batch:
+                return
+            write = self._loop.create_task(self._write(batch))
+            self._writes.add(write)
+            write.add_done_callback(self._writes.discard)
+            # If this caller is cancelled the write carries on; the lock is
+            # released and the next flush may run alongside it
+            await asyncio.shield(write)
+
+    async def _write(self, batch: List[tuple]):
+        started = time.perf_counter()
+        items = [item for item, _ in batch]
+        ok = False
+        try:
+            # Encode before checking out a connection
+            embeddings = await embedding_service.embed_many([item["content"] for item in items])
+            async with self.session_factory() as db:
+                written = await MemoryManager(db).add_memories(items, embeddings=embeddings)
+                await db.commit()
+            MemoryManager.apply_committed_writes(written)
+            ok = True
+        except Exception as e:
+            print(f"[DEBUG] Memory write batch of {len(batch)} failed: {e}")
+        finally:
+            # Also reached if the loop itself is shutting down: waiters learn the batch failed
+            self.flush_seconds += time.perf_counter() - started
+            self.batches += 1
+            self.max_batch_seen = max(self.max_batch_seen, len(batch))
+            if ok:
+                self.written += len(batch)
+            else:
+                self.failed += len(batch)
+            for _, future in batch:
+                if not future.done():
+                    future.set_result(ok)
+
+    async def drain(self):
+        """Flush whatever is left and stop the flusher (app shutdown).
+
+        A flush already in progress is waited for, not cancelled: the flusher
+        is only cancelled while this holds the flush lock, i.e. while it is idle.
+        """
+        if self._flusher is not None:
+            async with self._flush_lock:
+                self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+        # Writes whose flushing caller was cancelled earlier
+        if self._writes:
+            await asyncio.gather(*self._writes)
+
+    def _ensure_flusher(self):
+        loop = asyncio.get_running_loop()
+        if self._flusher is None or self._flusher.done() or self._loop is not loop:
+            self._loop = loop
+            self._has_items = asyncio.Event()
+            self._batch_full = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._flusher = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._has_items.wait()
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "durability": self.durability,
+            "buffered": len(self._pending),
+            "submitted": self.submitted,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "avg_batch_size": round((self.written + self.failed) / self.batches, 2) if self.batches else 0,
+            "max_batch_size": self.max_batch_seen,
+            "avg_flush_ms": round(self.flush_seconds / self.batches * 1000, 2) if self.batches else 0,
+        }
+
+
+memory_writer = MemoryWriteBuffer()
@@ -1,8 +1,55 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Computed, Integer, Float, String, DateTime, ForeignKey, Text, JSON, Index, UniqueConstraint, literal_column
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import BIT, HALFVEC, Vector
 from .database import Base
+import os
+
+# ANN index for memories.embedding: "hnsw" (default) or "ivfflat".
+# Cosine operator class to match the normalized MiniLM embeddings.
+MEMORY_VECTOR_INDEX = os.getenv("MEMORY_VECTOR_INDEX", "hnsw")
+MEMORY_HNSW_M = int(os.getenv("MEMORY_HNSW_M", "16"))
+MEMORY_HNSW_EF_CONSTRUCTION = int(os.getenv("MEMORY_HNSW_EF_CONSTRUCTION", "64"))
+MEMORY_IVFFLAT_LISTS = int(os.getenv("MEMORY_IVFFLAT_LISTS", "100"))
+# Storage for memories.embedding (applied by migration 1234567890b5):
+#   "vector"  - float32, 1.5 KB per row
+#   "halfvec" - float16, half the table and index size
+#   "binary"  - float32 plus a generated bit(384) column whose HNSW index replaces
+#               the float one; search takes Hamming-distance candidates and reranks them exactly
+MEMORY_VECTOR_STORAGE = os.getenv("MEMORY_VECTOR_STORAGE", "vector")
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2 embedding size
+
+def _memory_embedding_type():
+    return HALFVEC(EMBEDDING_DIM) if MEMORY_VECTOR_STORAGE == "halfvec" else Vector(EMBEDDING_DIM)
+
+def _memory_embedding_index() -> Index:
+    ops = "halfvec_cosine_ops" if MEMORY_VECTOR_STORAGE == "halfvec" else "vector_cosine_ops"
+    if MEMORY_VECTOR_INDEX == "ivfflat":
+        return Index(
+            "ix_memories_embedding_ann", "embedding",
+            postgresql_using="ivfflat",
+            postgresql_with={"lists": MEMORY_IVFFLAT_LISTS},
+            postgresql_ops={"embedding": ops},
+        )
+    return Index(
+        "ix_memories_embedding_ann", "embedding",
+        postgresql_using="hnsw",
+        postgresql_with={"m": MEMORY_HNSW_M, "ef_construction": MEMORY_HNSW_EF_CONSTRUCTION},
+        postgresql_ops={"embedding": ops},
+    )
+
+def _memory_table_args() -> tuple:
+    if MEMORY_VECTOR_STORAGE != "binary":
+        return (_memory_embedding_index(),)
+    # Binary mode only indexes the bits: the float vectors are just for reranking
+    return (
+        Index(
+            "ix_memories_embedding_bits_ann", "embedding_bits",
+            postgresql_using="hnsw",
+            postgresql_with={"m": MEMORY_HNSW_M, "ef_construction": MEMORY_HNSW_EF_CONSTRUCTION},
+            postgresql_ops={"embedding_bits": "bit_hamming_ops"},
+        ),
+    )
 
 class User(Base):
     __tablename__ = "users"
@@ -22,6 +69,9 @@ class Conversation(Base):
     title = Column(String)
     is_guest_mode = Column(Integer, default=0)  # SQLite doesn't have real boolean, use 0/1
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Maintained by services.append_message so rollover checks never scan messages
+    message_count = Column(Integer, default=0, server_default="0", nullable=False)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
     
     user = relationship("User", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation")
@@ -41,6 +91,109 @@ class Memory(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Nullable for backward compatibility
     content = Column(Text)
-    embedding = Column(Vector(384)) # all-MiniLM-L6-v2 embedding size
+    embedding = Column(_memory_embedding_type())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     metadata_ = Column(JSON, default={})
+    if MEMORY_VECTOR_STORAGE == "binary":
+        # Maintained by Postgres; never loaded with the row
+        embedding_bits = deferred(Column(
+            BIT(EMBEDDING_DIM), Computed(f"binary_quantize(embedding)::bit({EMBEDDING_DIM})", persisted=True)
+        ))
+
+    __table_args__ = _memory_table_args()
+
+class ConceptProgress(Base):
+    __tablename__ = "concept_progress"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    concept_key = Column(String, nullable=False)  # srs.normalize_concept(concept)
+    concept = Column(String, nullable=False)  # Latest wording, shown in the prompt
+    state = Column(String, nullable=True)  # unknown, learning, practicing, mastered
+    performance = Column(String, nullable=True)  # low, medium, high (last review)
+    last_reviewed_at = Column(DateTime(timezone=True), nullable=True)
+    next_review_at = Column(DateTime(timezone=True), nullable=True)
+    # SM-2 schedule (see srs.next_schedule)
+    ease = Column(Float, default=2.5, server_default="2.5", nullable=False)
+    interval_days = Column(Float, default=0, server_default="0", nullable=False)
+    repetitions = Column(Integer, default=0, server_default="0", nullable=False)
+    review_count = Column(Integer, default=0, server_default="0", nullable=False)
+    # Review quiz pre-generation (see quiz_worker.py): last attempt, and backoff after failures
+    quiz_pregen_at = Column(DateTime(timezone=True), nullable=True)
+    quiz_pregen_failures = Column(Integer, default=0, server_default="0", nullable=False)
+    quiz_pregen_retry_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # One row per concept: updates are INSERT ... ON CONFLICT upserts
+    __table_args__ = (UniqueConstraint("user_id", "concept_key", name="uq_concept_progress_user_id_concept_key"),)
+
+class Quiz(Base):
+    __tablename__ = "quizzes"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    concept = Column(String, nullable=True)  # Reviewed via SRS once every question is answered
+    concept_key = Column(String, nullable=True)  # srs.normalize_concept(concept)
+    questions = Column(JSON, nullable=False)  # present_quiz questions, including correct_answer/xp_reward
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Review quizzes made ahead of time by the quiz worker; served at most once, before expires_at
+    pregenerated = Column(Integer, default=0, server_default="0", nullable=False)
+    served_at = Column(DateTime(timezone=True), nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=True)
+
+class QuizAnswer(Base):
+    __tablename__ = "quiz_answers"
+    id = Column(Integer, primary_key=True, index=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False)
+    question_index = Column(Integer, nullable=False)
+    answer = Column(Text)
+    correct = Column(Integer, default=0)  # 0/1
+    xp_awarded = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # One graded answer per question: resubmissions never award XP twice
+    __table_args__ = (UniqueConstraint("quiz_id", "question_index", name="uq_quiz_answers_quiz_id_question_index"),)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # e.g. "title", "rollover_summary"
+    payload = Column(JSON, default={})
+    status = Column(String, default="pending", nullable=False)  # pending, running, done, failed
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    # Not claimable before this; pushed back after each failed attempt
+    run_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Lease held by the running worker; another worker may claim the job once it lapses
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+def memory_metadata(key: str):
+    """`memories.metadata_ ->> 'key'` with the key inlined rather than bound.
+
+    Expression indexes only match when the query's expression is identical, and a
+    bound key ($1) would not match them under generic prepared-statement plans.
+    """
+    return Memory.metadata_.op("->>")(literal_column(f"'{key}'"))
+
+# Composite / expression indexes matching the hot query shapes
+Index("ix_messages_conversation_id_created_at", Message.conversation_id, Message.created_at)
+Index("ix_conversations_user_id_created_at", Conversation.user_id, Conversation.created_at.desc())
+Index("ix_memories_user_id_created_at", Memory.user_id, Memory.created_at.desc())
+Index(
+    "ix_memories_user_id_category_created_at",
+    Memory.user_id, memory_metadata("category"), Memory.created_at.desc()
+)
+# Due queue / due counts: WHERE user_id = ? AND next_review_at <= now() ORDER BY next_review_at
+Index("ix_concept_progress_user_id_next_review_at", ConceptProgress.user_id, ConceptProgress.next_review_at)
+Index("ix_concept_progress_user_id_updated_at", ConceptProgress.user_id, ConceptProgress.updated_at.desc())
+# Unserved pre-generated review quizzes, looked up per user/concept on every turn with due items
+Index(
+    "ix_quizzes_ready",
+    Quiz.user_id, Quiz.concept_key,
+    postgresql_where=(Quiz.pregenerated == 1) & Quiz.served_at.is_(None)
+)
+# Jobs still to run, scanned by JobQueue.start()
+Index("ix_jobs_unfinished", Job.id, postgresql_where=Job.status.in_(["pending", "running"]))
@@ -0,0 +1,168 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update, delete, exists, func, and_, or_
+from .database import AsyncSessionLocal
+from .llm import get_llm_provider
+from .models import ConceptProgress, Quiz, User
+from .prompts import ACTION_TOOL_SCHEMAS, REVIEW_QUIZ_PROMPT
+from .quizzes import create_quiz
+
+QUIZ_PREGEN_ENABLED = os.getenv("QUIZ_PREGEN_ENABLED", "1") == "1"
+QUIZ_PREGEN_INTERVAL_SECONDS = float(os.getenv("QUIZ_PREGEN_INTERVAL_SECONDS", "900"))
+# Concepts due within this window get a quiz ahead of time
+QUIZ_PREGEN_LOOKAHEAD_HOURS = float(os.getenv("QUIZ_PREGEN_LOOKAHEAD_HOURS", "24"))
+# Unserved quizzes expire after this; a concept only gets another once it is reviewed again
+QUIZ_PREGEN_TTL_HOURS = float(os.getenv("QUIZ_PREGEN_TTL_HOURS", "72"))
+# Only users active within this many days get quizzes made ahead of time
+QUIZ_PREGEN_ACTIVE_DAYS = float(os.getenv("QUIZ_PREGEN_ACTIVE_DAYS", "7"))
+# Failed generations are retried after this, doubling per failure, up to QUIZ_PREGEN_MAX_FAILURES
+QUIZ_PREGEN_RETRY_MINUTES = float(os.getenv("QUIZ_PREGEN_RETRY_MINUTES", "30"))
+QUIZ_PREGEN_MAX_FAILURES = int(os.getenv("QUIZ_PREGEN_MAX_FAILURES", "4"))
+QUIZ_PREGEN_BATCH_SIZE = int(os.getenv("QUIZ_PREGEN_BATCH_SIZE", "50"))
+QUIZ_PREGEN_CONCURRENCY = int(os.getenv("QUIZ_PREGEN_CONCURRENCY", "4"))
+# Cheap model for background generation; empty keeps the default provider's model
+QUIZ_PREGEN_MODEL = os.getenv("QUIZ_PREGEN_MODEL", "")
+
+_worker_stats = {
+    "runs": 0,
+    "generated": 0,
+    "failed": 0,
+    "gave_up": 0,
+    "expired": 0,
+    "last_run_seconds": 0.0,
+}
+
+def get_quiz_worker_stats() -> dict:
+    return {"enabled": QUIZ_PREGEN_ENABLED, **_worker_stats}
+
+async def find_upcoming_reviews(db, limit: int = QUIZ_PREGEN_BATCH_SIZE):
+    """(user_id, concept_key, concept, state, quiz_pregen_failures) for concepts coming due.
+
+    Only recently active users are considered, and a concept is skipped while
+    it has a ready quiz. Otherwise it needs a quiz if none was attempted since
+    its last review (an expired, unserved quiz is not replaced until the
+    learner reviews the concept again), or if a failed attempt's backoff has
+    passed.
+    """
+    has_ready_quiz = exists().where(
+        Quiz.user_id == ConceptProgress.user_id,
+        Quiz.concept_key == ConceptProgress.concept_key,
+        Quiz.pregenerated == 1,
+        Quiz.served_at.is_(None),
+        Quiz.expires_at > func.now(),
+    )
+    needs_quiz = or_(
+        and_(
+            ConceptProgress.quiz_pregen_retry_at.is_(None),
+            or_(
+                ConceptProgress.quiz_pregen_at.is_(None),
+                ConceptProgress.quiz_pregen_at < ConceptProgress.last_reviewed_at,
+            ),
+        ),
+        ConceptProgress.quiz_pregen_retry_at <= func.now(),
+    )
+    now = datetime.now(timezone.utc)
+    horizon = now + timedelta(hours=QUIZ_PREGEN_LOOKAHEAD_HOURS)
+    stmt = (
+        select(
+            ConceptProgress.user_id, ConceptProgress.concept_key, ConceptProgress.concept,
+            ConceptProgress.state, ConceptProgress.quiz_pregen_failures,
+        )
+        .join(User, User.id == ConceptProgress.user_id)
+        .where(
+            User.last_active_date >= now - timedelta(days=QUIZ_PREGEN_ACTIVE_DAYS),
+            ConceptProgress.next_review_at <= horizon,
+            needs_quiz,
+            ~has_ready_quiz,
+        )
+        .order_by(ConceptProgress.next_review_at)
+        .limit(limit)
+    )
+    result = await db.execute(stmt)
+    return result.all()
+
+async def generate_review_quiz(llm, concept: str, state: str = None):
+    """One forced present_quiz call; returns the tool input or None."""
+    messages = [
+        {"role": "system", "content": REVIEW_QUIZ_PROMPT},
+        {"role": "user", "content": f"Concept: {concept}\nCurrent mastery state: {state or 'unknown'}"},
+    ]
+    response = await llm.generate(messages, ACTION_TOOL_SCHEMAS["present_quiz"], tool_choice="present_quiz")
+    for tc in response.tool_calls:
+        if tc["name"] == "present_quiz" and tc["input"].get("questions"):
+            return tc["input"]
+    return None
+
+async def pregenerate_review_quizzes(session_factory=AsyncSessionLocal):
+    """Scan for upcoming reviews and store a ready quiz for each.
+
+    No connection is held during generation: one short session reads the
+    work list, LLM calls run with bounded concurrency, and one more session
+    writes the results.
+    """
+    started = time.perf_counter()
+    async with session_factory() as db:
+        expired = await db.execute(
+            delete(Quiz).where(Quiz.pregenerated == 1, Quiz.served_at.is_(None), Quiz.expires_at <= func.now())
+        )
+        _worker_stats["expired"] += expired.rowcount or 0
+        reviews = await find_upcoming_reviews(db)
+        await db.commit()
+
+    if reviews:
+        llm = get_llm_provider()
+        if QUIZ_PREGEN_MODEL:
+            llm.model = QUIZ_PREGEN_MODEL
+        semaphore = asyncio.Semaphore(QUIZ_PREGEN_CONCURRENCY)
+
+        async def generate(review):
+            async with semaphore:
+                try:
+                    return review, await generate_review_quiz(llm, review.concept, review.state)
+                except Exception as e:
+                    print(f"[DEBUG] Review quiz generation failed for '{review.concept}': {e}")
+                    return review, None
+
+        generated = await asyncio.gather(*(generate(review) for review in reviews))
+
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(hours=QUIZ_PREGEN_TTL_HOURS)
+        async with session_factory() as db:
+            for review, quiz_data in generated:
+                attempt = {"quiz_pregen_at": now, "quiz_pregen_failures": 0, "quiz_pregen_retry_at": None}
+                if quiz_data is None:
+                    _worker_stats["failed"] += 1
+                    failures = review.quiz_pregen_failures + 1
+                    attempt["quiz_pregen_failures"] = failures
+                    # Past the limit retry_at stays NULL: the next review makes it eligible again
+                    if failures < QUIZ_PREGEN_MAX_FAILURES:
+                        attempt["quiz_pregen_retry_at"] = now + timedelta(
+                            minutes=QUIZ_PREGEN_RETRY_MINUTES * 2 ** (failures - 1)
+                        )
+                    else:
+                        _worker_stats["gave_up"] += 1
+                else:
+                    # claim_ready_quiz matches on the normalized key; the wording is for display
+                    await create_quiz(db, review.user_id, {**quiz_data, "concept": review.concept}, expires_at=expires_at)
+                    _worker_stats["generated"] += 1
+                await db.execute(
+                    update(ConceptProgress)
+                    .where(ConceptProgress.user_id == review.user_id, ConceptProgress.concept_key == review.concept_key)
+                    .values(**attempt)
+                )
+            await db.commit()
+        print(f"[DEBUG] Pre-generated {sum(1 for _, q in generated if q)} review quizzes")
+
+    _worker_stats["runs"] += 1
+    _worker_stats["last_run_seconds"] = round(time.perf_counter() - started, 2)
+
+async def run_quiz_worker(session_factory=AsyncSessionLocal):
+    """Periodic loop started from the app lifespan; cancelled on shutdown."""
+    while True:
+        try:
+            await pregenerate_review_quizzes(session_factory)
+        except Exception as e:
+            print(f"[DEBUG] Quiz pre-generation run failed: {e}")
+        await asyncio.sleep(QUIZ_PREGEN_INTERVAL_SECONDS)
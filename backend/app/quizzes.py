@@ -0,0 +1,157 @@
+from typing import Any, Dict, List, Optional
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import Quiz, QuizAnswer, User
+from .srs import normalize_concept, quality_from_score, record_review
+
+DEFAULT_XP_REWARD = 100
+# Matches the QuizCard hint cost in the frontend
+HINT_XP_PENALTY = 50
+
+async def create_quiz(db: AsyncSession, user_id: int, quiz_data: Dict[str, Any], expires_at=None) -> Quiz:
+    """Store a present_quiz payload; flushes so the caller gets quiz.id before committing.
+
+    Passing `expires_at` stores it as a pre-generated review quiz, to be served
+    later by claim_ready_quiz.
+    """
+    concept = quiz_data.get("concept")
+    quiz = Quiz(
+        user_id=user_id,
+        concept=concept,
+        concept_key=normalize_concept(concept) if concept else None,
+        questions=quiz_data.get("questions", []),
+        pregenerated=1 if expires_at else 0,
+        expires_at=expires_at,
+    )
+    db.add(quiz)
+    await db.flush()
+    return quiz
+
+async def claim_ready_quiz(db: AsyncSession, user_id: int, concepts: List[str]) -> Optional[Quiz]:
+    """Mark one unexpired pre-generated quiz for any of `concepts` as served and return it.
+
+    Concepts match by normalized key, so a quiz made under older wording still
+    counts. SKIP LOCKED keeps two concurrent turns from serving the same quiz.
+    """
+    if not concepts:
+        return None
+    ready = (
+        select(Quiz.id)
+        .where(
+            Quiz.user_id == user_id,
+            Quiz.concept_key.in_([normalize_concept(c) for c in concepts]),
+            Quiz.pregenerated == 1,
+            Quiz.served_at.is_(None),
+            Quiz.expires_at > func.now(),
+        )
+        .order_by(Quiz.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(Quiz).where(Quiz.id == ready).values(served_at=func.now()).returning(Quiz)
+    )
+    return result.scalars().first()
+
+async def expire_ready_quizzes(db: AsyncSession, user_id: int, concept: str):
+    """Drop unserved pre-generated quizzes for a concept whose state just changed."""
+    await db.execute(
+        delete(Quiz).where(
+            Quiz.user_id == user_id,
+            Quiz.concept_key == normalize_concept(concept),
+            Quiz.pregenerated == 1,
+            Quiz.served_at.is_(None),
+        )
+    )
+
+def _performance(score: float):
+    """(state, performance) for an update_concept_state-style review from a quiz score."""
+    if score >= 0.8:
+        return "mastered", "high"
+    if score >= 0.5:
+        return "practicing", "medium"
+    return "practicing", "low"
+
+async def submit_answers(db: AsyncSession, quiz: Quiz, answers: List[Dict[str, Any]], record_progress: bool = True) -> Dict[str, Any]:
+    """Grade answers and award XP in the caller's transaction; the caller commits.
+
+    Only the first answer to each question counts: answers go in with
+    ON CONFLICT DO NOTHING and XP is awarded for the rows actually inserted,
+    so retries and double submits are idempotent. When this submission
+    completes a quiz that has a concept, an SRS review is recorded for it.
+    """
+    questions = quiz.questions or []
+    graded = {}
+    for a in answers:
+        index = a["question_index"]
+        if not 0 <= index < len(questions):
+            raise ValueError(f"Question index {index} out of range")
+        if index in graded:
+            continue
+        question = questions[index]
+        correct = a["answer"] == question.get("correct_answer")
+        xp = question.get("xp_reward", DEFAULT_XP_REWARD) - (HINT_XP_PENALTY if a.get("hint_used") else 0)
+        graded[index] = {
+            "question_index": index,
+            "answer": a["answer"],
+            "correct": correct,
+            "correct_answer": question.get("correct_answer"),
+            "xp_awarded": max(0, xp) if correct else 0,
+        }
+
+    inserted = set()
+    if graded:
+        stmt = (
+            pg_insert(QuizAnswer)
+            .values([
+                {"quiz_id": quiz.id, "question_index": g["question_index"], "answer": g["answer"],
+                 "correct": 1 if g["correct"] else 0, "xp_awarded": g["xp_awarded"]}
+                for g in graded.values()
+            ])
+            .on_conflict_do_nothing(index_elements=["quiz_id", "question_index"])
+            .returning(QuizAnswer.question_index)
+        )
+        inserted = set((await db.execute(stmt)).scalars().all())
+
+    results = []
+    for g in graded.values():
+        already_answered = g["question_index"] not in inserted
+        results.append({
+            "question_index": g["question_index"],
+            "correct": g["correct"],
+            "correct_answer": g["correct_answer"],
+            "xp_awarded": 0 if already_answered else g["xp_awarded"],
+            "already_answered": already_answered,
+        })
+    xp_awarded = sum(r["xp_awarded"] for r in results)
+
+    # Atomic increment; RETURNING gives the new total without a second read
+    if xp_awarded:
+        total_xp = (await db.execute(
+            update(User).where(User.id == quiz.user_id).values(xp=User.xp + xp_awarded).returning(User.xp)
+        )).scalar()
+    else:
+        total_xp = (await db.execute(select(User.xp).where(User.id == quiz.user_id))).scalar()
+
+    answered, correct_count = (await db.execute(
+        select(func.count(), func.coalesce(func.sum(QuizAnswer.correct), 0)).where(QuizAnswer.quiz_id == quiz.id)
+    )).one()
+    completed = bool(questions) and answered >= len(questions)
+    score = correct_count / len(questions) if questions else 0
+
+    if completed and inserted and record_progress and quiz.concept:
+        state, performance = _performance(score)
+        await record_review(db, quiz.user_id, quiz.concept, state, quality_from_score(score), performance)
+        await expire_ready_quizzes(db, quiz.user_id, quiz.concept)
+        print(f"[DEBUG] Quiz {quiz.id} completed: {quiz.concept} -> {state} ({performance})")
+
+    return {
+        "quiz_id": quiz.id,
+        "results": results,
+        "xp_awarded": xp_awarded,
+        "total_xp": total_xp,
+        "completed": completed,
+        "score": round(score, 2),
+    }
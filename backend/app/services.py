@@ -1,16 +1,100 @@
+import os
+from typing import Dict
+from sqlalchemy import select, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from .database import AsyncSessionLocal
 from .models import Conversation, Message
 from .llm import get_llm_provider
+from .jobs import job_queue
 
-async def rollover_session(conversation_id: int, db: AsyncSession):
-    # 1. Fetch current conversation messages
-    stmt = select(Message).where(Message.conversation_id == conversation_id).order_by(Message.created_at)
+# Title prefix of a conversation started by rollover_session
+FOLLOW_UP_PREFIX = "Follow-up:"
+# How long a first turn in a follow-up conversation waits for the previous session's summary
+ROLLOVER_SUMMARY_WAIT_SECONDS = float(os.getenv("ROLLOVER_SUMMARY_WAIT_SECONDS", "10"))
+
+# Follow-up conversation id -> its rollover_summary job, while the job runs in this process
+_summary_jobs: Dict[int, int] = {}
+
+def strip_follow_up(title: str) -> str:
+    """The topic part of a conversation title, without any "Follow-up:" prefixes."""
+    title = title.strip()
+    while title.startswith(FOLLOW_UP_PREFIX):
+        title = title[len(FOLLOW_UP_PREFIX):].strip()
+    return title
+
+async def append_message(db: AsyncSession, conversation_id: int, role: str, content: str) -> Message:
+    """Add a message and bump the conversation's message_count/last_message_at.
+
+    The counter update is a single atomic UPDATE in the caller's transaction,
+    so it commits (or rolls back) together with the message row.
+    """
+    message = Message(conversation_id=conversation_id, role=role, content=content)
+    db.add(message)
+    await db.execute(
+        update(Conversation)
+        .where(Conversation.id == conversation_id)
+        .values(message_count=Conversation.message_count + 1, last_message_at=func.now())
+    )
+    return message
+
+async def load_history(db: AsyncSession, conversation_id: int):
+    """Return (role, content) tuples in order, without loading full ORM rows."""
+    stmt = select(Message.role, Message.content).where(Message.conversation_id == conversation_id).order_by(Message.created_at)
     result = await db.execute(stmt)
-    messages = result.scalars().all()
+    return result.all()
+
+async def rollover_session(conversation_id: int, session_factory=AsyncSessionLocal):
+    """Start a follow-up conversation right away.
+
+    The previous session's summary is written into it by a background
+    "rollover_summary" job. Returns (new_conversation_id, summary_job_id).
+    """
+    async with session_factory() as db:
+        # Get user_id from the old conversation
+        conv_stmt = select(Conversation).where(Conversation.id == conversation_id)
+        conv_result = await db.execute(conv_stmt)
+        old_conv = conv_result.scalar_one()
+        
+        # Already titled, so the first turn in it doesn't queue a title job;
+        # one prefix however many times the session has rolled over
+        new_conv = Conversation(user_id=old_conv.user_id, title=f"{FOLLOW_UP_PREFIX} {strip_follow_up(old_conv.title or '')}")
+        db.add(new_conv)
+        await db.commit()
+    
+    job_id = await job_queue.enqueue("rollover_summary", {
+        "conversation_id": conversation_id,
+        "new_conversation_id": new_conv.id,
+    })
+    _summary_jobs[new_conv.id] = job_id
+    return new_conv.id, job_id
+
+async def wait_for_rollover_summary(conversation_id: int):
+    """Give a follow-up conversation's summary job a chance to finish before its history is read.
+
+    Only jobs running in this process are waited for. After the timeout the
+    turn goes ahead without the summary; it still sorts first in the history
+    once it lands (see summarize_rollover).
+    """
+    job_id = _summary_jobs.get(conversation_id)
+    if job_id is not None:
+        await job_queue.wait(job_id, ROLLOVER_SUMMARY_WAIT_SECONDS)
+
+@job_queue.register("rollover_summary")
+async def summarize_rollover(payload: dict, session_factory=AsyncSessionLocal) -> dict:
+    """Summarize the old conversation into the follow-up one (job handler)."""
+    try:
+        return await _summarize_rollover(payload, session_factory)
+    finally:
+        _summary_jobs.pop(payload["new_conversation_id"], None)
+
+async def _summarize_rollover(payload: dict, session_factory=AsyncSessionLocal) -> dict:
+    # Each DB step is its own short session so no connection is held during summarization
+    # 1. Fetch old conversation messages
+    async with session_factory() as db:
+        messages = await load_history(db, payload["conversation_id"])
     
     if not messages:
-        return None
+        return {"conversation_id": payload["new_conversation_id"], "summarized": False}
 
     # 2. Generate Summary
     llm = get_llm_provider()
@@ -25,29 +109,21 @@ async def rollover_session(conversation_id: int, db: AsyncSession):
     summary_response = await llm.generate(summary_prompt, tools=[])
     summary_text = summary_response.content
 
-    # 3. Create New Conversation
-    # Get user_id from the old conversation
-    conv_stmt = select(Conversation).where(Conversation.id == conversation_id)
-    conv_result = await db.execute(conv_stmt)
-    old_conv = conv_result.scalar_one()
-    
-    new_conv = Conversation(user_id=old_conv.user_id, title=f"Follow-up: {old_conv.title}")
-    db.add(new_conv)
-    await db.commit()
-    await db.refresh(new_conv)
-    
-    # 4. Add Summary as System/Context Message
-    # We can add it as a 'system' message or a special 'assistant' message at the start.
-    # Let's add it as a system message to be injected by the Agent, 
-    # BUT since we store messages in DB, we might want to store it as a 'system' role message 
-    # so it's loaded when history is fetched.
-    
-    summary_msg = Message(
-        conversation_id=new_conv.id,
-        role="system",
-        content=f"PREVIOUS SESSION SUMMARY:\n{summary_text}"
-    )
-    db.add(summary_msg)
-    await db.commit()
+    # 3. Add Summary as a 'system' message so it is loaded with the new conversation's history
+    async with session_factory() as db:
+        summary = await append_message(
+            db,
+            payload["new_conversation_id"],
+            role="system",
+            content=f"PREVIOUS SESSION SUMMARY:\n{summary_text}"
+        )
+        # Dated at the conversation's start so it loads first, even if the
+        # learner sent messages before the job finished
+        summary.created_at = (
+            select(Conversation.created_at)
+            .where(Conversation.id == payload["new_conversation_id"])
+            .scalar_subquery()
+        )
+        await db.commit()
     
-    return new_conv.id
+    return {"conversation_id": payload["new_conversation_id"], "summarized": True}
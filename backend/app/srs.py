@@ -0,0 +1,121 @@
+"""Spaced repetition scheduling (SM-2) for concept_progress."""
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import ConceptProgress
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+# Recall quality (0-5) below this is a lapse: the concept starts over
+PASSING_QUALITY = 3
+
+# update_concept_state reports performance as low/medium/high
+PERFORMANCE_QUALITY = {"low": 2, "medium": 4, "high": 5}
+
+
+@dataclass
+class Schedule:
+    ease: float = DEFAULT_EASE
+    interval_days: float = 0.0
+    repetitions: int = 0
+
+
+def normalize_concept(concept: str) -> str:
+    """Key a concept is stored under: trimmed, single-spaced, lower case."""
+    return " ".join(concept.split()).lower()
+
+
+def quality_from_performance(performance: str) -> int:
+    return PERFORMANCE_QUALITY.get(performance, PERFORMANCE_QUALITY["medium"])
+
+
+def quality_from_score(score: float) -> int:
+    """Map a quiz score (0-1) to SM-2 recall quality (0-5)."""
+    return max(0, min(5, round(score * 5)))
+
+
+def next_schedule(previous: Schedule, quality: int) -> Schedule:
+    """SM-2: the next interval grows by the ease factor after each passing review.
+
+    A lapse resets the repetition count and brings the concept back tomorrow;
+    every review adjusts ease by how hard the recall was.
+    """
+    ease = previous.ease + (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    ease = max(MIN_EASE, ease)
+    if quality < PASSING_QUALITY:
+        return Schedule(ease=ease, interval_days=1.0, repetitions=0)
+
+    repetitions = previous.repetitions + 1
+    if repetitions == 1:
+        interval = 1.0
+    elif repetitions == 2:
+        interval = 6.0
+    else:
+        interval = round(previous.interval_days * ease, 1)
+    return Schedule(ease=ease, interval_days=interval, repetitions=repetitions)
+
+
+async def record_review(db: AsyncSession, user_id: int, concept: str, state: str, quality: int,
+                        performance: Optional[str] = None) -> Schedule:
+    """Record a concept review in the caller's transaction and schedule the next one.
+
+    The current schedule is read under FOR UPDATE so concurrent reviews of the
+    same concept apply one after the other; the write is an upsert on
+    (user_id, concept_key), so a first review racing another still yields one row.
+    """
+    concept_key = normalize_concept(concept)
+    row = (await db.execute(
+        select(ConceptProgress.ease, ConceptProgress.interval_days, ConceptProgress.repetitions)
+        .where(ConceptProgress.user_id == user_id, ConceptProgress.concept_key == concept_key)
+        .with_for_update()
+    )).first()
+    schedule = next_schedule(Schedule(*row) if row else Schedule(), quality)
+
+    now = datetime.now(timezone.utc)
+    values = {
+        "concept": concept.strip(),
+        "state": state,
+        "performance": performance,
+        "ease": schedule.ease,
+        "interval_days": schedule.interval_days,
+        "repetitions": schedule.repetitions,
+        "last_reviewed_at": now,
+        "next_review_at": now + timedelta(days=schedule.interval_days),
+    }
+    stmt = pg_insert(ConceptProgress).values(user_id=user_id, concept_key=concept_key, review_count=1, **values)
+    await db.execute(stmt.on_conflict_do_update(
+        constraint="uq_concept_progress_user_id_concept_key",
+        # A new review also restarts the quiz worker's failure count for the concept
+        set_={**values, "review_count": ConceptProgress.review_count + 1, "quiz_pregen_failures": 0, "updated_at": func.now()},
+    ))
+    return schedule
+
+
+async def due_queue(db: AsyncSession, user_id: int, limit: int = 20) -> List[ConceptProgress]:
+    """Concepts due now, soonest first.
+
+    A bounded range scan on (user_id, next_review_at): the cost depends on
+    `limit`, not on how many concepts the user has.
+    """
+    result = await db.execute(
+        select(ConceptProgress)
+        .where(ConceptProgress.user_id == user_id, ConceptProgress.next_review_at <= func.now())
+        .order_by(ConceptProgress.next_review_at)
+        .limit(limit)
+    )
+    return result.scalars().all()
+
+
+async def due_counts(db: AsyncSession, user_ids: List[int]) -> Dict[int, int]:
+    """Number of due concepts for each user, in one grouped index scan."""
+    result = await db.execute(
+        select(ConceptProgress.user_id, func.count())
+        .where(ConceptProgress.user_id.in_(user_ids), ConceptProgress.next_review_at <= func.now())
+        .group_by(ConceptProgress.user_id)
+    )
+    counts = {user_id: 0 for user_id in user_ids}
+    counts.update(dict(result.all()))
+    return counts
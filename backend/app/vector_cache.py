@@ -0,0 +1,219 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Off by default: with several worker processes each keeps its own copy, and
+# writes made by one process reach the others only after MEMORY_VECTOR_CACHE_TTL_SECONDS
+MEMORY_VECTOR_CACHE_ENABLED = os.getenv("MEMORY_VECTOR_CACHE_ENABLED", "0") == "1"
+MEMORY_VECTOR_CACHE_MAX_MB = float(os.getenv("MEMORY_VECTOR_CACHE_MAX_MB", "64"))
+# Users idle this long are dropped on the next cache access
+MEMORY_VECTOR_CACHE_IDLE_SECONDS = float(os.getenv("MEMORY_VECTOR_CACHE_IDLE_SECONDS", "1800"))
+# Entries are reloaded from the database after this long, even while in use
+MEMORY_VECTOR_CACHE_TTL_SECONDS = float(os.getenv("MEMORY_VECTOR_CACHE_TTL_SECONDS", "600"))
+# Users with more memories than this stay on the database ANN index
+MEMORY_VECTOR_CACHE_MAX_ROWS = int(os.getenv("MEMORY_VECTOR_CACHE_MAX_ROWS", "5000"))
+
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2, as in models.Memory.embedding
+
+CachedRow = Tuple[int, str, Optional[str], Optional[str]]  # (id, content, category, state)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def _as_matrix(embeddings: Iterable, count: int) -> np.ndarray:
+    if count == 0:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    return _normalize(np.asarray(list(embeddings), dtype=np.float32).reshape(count, -1))
+
+
+@dataclass
+class UserVectors:
+    """One user's memories: a contiguous, L2-normalized float32 matrix plus row data.
+
+    The matrix has spare capacity so appends do not reallocate every time;
+    only the first `size` rows are live.
+    """
+    matrix: np.ndarray
+    rows: List[CachedRow]
+    positions: Dict[int, int] = field(default_factory=dict)
+    loaded_at: float = field(default_factory=time.monotonic)
+    last_used: float = field(default_factory=time.monotonic)
+
+    @property
+    def size(self) -> int:
+        return len(self.rows)
+
+    @property
+    def nbytes(self) -> int:
+        return self.matrix.nbytes + sum(len(row[1]) for row in self.rows) + 64 * self.size
+
+    def upsert(self, row: CachedRow, vector: np.ndarray):
+        position = self.positions.get(row[0])
+        if position is None:
+            position = self.size
+            if position == len(self.matrix):
+                grown = np.empty((max(2 * len(self.matrix), 16), self.matrix.shape[1]), dtype=np.float32)
+                grown[:position] = self.matrix[:position]
+                self.matrix = grown
+            self.rows.append(row)
+            self.positions[row[0]] = position
+        else:
+            self.rows[position] = row
+        self.matrix[position] = vector
+
+
+class VectorCache:
+    """Per-user in-process cache of memory embeddings for semantic search.
+
+    A warm user's top-k is one matrix-vector product and an argpartition;
+    cold users (not loaded yet, too many rows, or cache disabled) go to the
+    database ANN index. Writes patch loaded entries in place, and idle users
+    are evicted first, then least recently used ones, to stay within the memory budget.
+    """
+
+    def __init__(self, enabled: bool = MEMORY_VECTOR_CACHE_ENABLED,
+                 max_bytes: int = int(MEMORY_VECTOR_CACHE_MAX_MB * 1024 * 1024),
+                 idle_seconds: float = MEMORY_VECTOR_CACHE_IDLE_SECONDS,
+                 ttl_seconds: float = MEMORY_VECTOR_CACHE_TTL_SECONDS,
+                 max_rows: int = MEMORY_VECTOR_CACHE_MAX_ROWS):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self._users: "OrderedDict[int, UserVectors]" = OrderedDict()
+        self._bytes = 0
+        # Users found to be over max_rows, so they are not re-fetched on every miss
+        self._oversized: Dict[int, float] = {}
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.patches = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int) -> Optional[UserVectors]:
+        if not self.enabled:
+            return None
+        self._evict_idle()
+        entry = self._users.get(user_id)
+        if entry is not None and time.monotonic() - entry.loaded_at > self.ttl_seconds:
+            self._drop(user_id)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        entry.last_used = time.monotonic()
+        self._users.move_to_end(user_id)
+        self.hits += 1
+        return entry
+
+    def should_load(self, user_id: int) -> bool:
+        if not self.enabled:
+            return False
+        skipped_at = self._oversized.get(user_id)
+        if skipped_at is not None and time.monotonic() - skipped_at < self.ttl_seconds:
+            return False
+        self._oversized.pop(user_id, None)
+        return True
+
+    def load(self, user_id: int, rows: List[CachedRow], embeddings: Iterable) -> bool:
+        """Cache a user's full memory set, as loaded from the database."""
+        if not self.enabled:
+            return False
+        if len(rows) > self.max_rows:
+            self._oversized[user_id] = time.monotonic()
+            return False
+        entry = UserVectors(matrix=np.ascontiguousarray(_as_matrix(embeddings, len(rows))), rows=list(rows))
+        entry.positions = {row[0]: i for i, row in enumerate(entry.rows)}
+        self._drop(user_id)
+        self._users[user_id] = entry
+        self._bytes += entry.nbytes
+        self.loads += 1
+        self._evict_over_budget()
+        return True
+
+    def top_k(self, entry: UserVectors, query_embedding: List[float], k: int,
+              category: str = None) -> List[Tuple[CachedRow, float]]:
+        """(row, cosine distance) for the k nearest memories, nearest first."""
+        if entry.size == 0:
+            return []
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        scores = entry.matrix[:entry.size] @ query
+        if category is not None:
+            mask = np.fromiter((row[2] == category for row in entry.rows), dtype=bool, count=entry.size)
+            scores = np.where(mask, scores, -np.inf)
+        k = min(k, entry.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(entry.rows[i], float(1 - scores[i])) for i in top if np.isfinite(scores[i])]
+
+    def patch(self, user_id: int, rows: List[CachedRow], embeddings: Iterable):
+        """Apply inserted or refreshed memories to a loaded user; no-op for cold users."""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return
+        self._bytes -= entry.nbytes
+        vectors = _as_matrix(embeddings, len(rows))
+        for row, vector in zip(rows, vectors):
+            entry.upsert(row, vector)
+        if entry.size > self.max_rows:
+            del self._users[user_id]
+            self._oversized[user_id] = time.monotonic()
+            return
+        self._bytes += entry.nbytes
+        self.patches += len(rows)
+        self._evict_over_budget()
+
+    def invalidate(self, user_id: int):
+        if self._drop(user_id):
+            self.invalidations += 1
+
+    def _drop(self, user_id: int) -> bool:
+        entry = self._users.pop(user_id, None)
+        if entry is None:
+            return False
+        self._bytes -= entry.nbytes
+        return True
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        # LRU order: the oldest entries are first
+        while self._users:
+            user_id, entry = next(iter(self._users.items()))
+            if now - entry.last_used <= self.idle_seconds:
+                break
+            self._drop(user_id)
+            self.evictions += 1
+
+    def _evict_over_budget(self):
+        while self._bytes > self.max_bytes and len(self._users) > 1:
+            self._drop(next(iter(self._users)))
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "users": len(self._users),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "loads": self.loads,
+            "patches": self.patches,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+        }
+
+
+vector_cache = VectorCache()
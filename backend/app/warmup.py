@@ -0,0 +1,41 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+from .embeddings import embedding_service
+from .llm import import_llm_sdk
+
+# Load the embedding model and the default LLM SDK in the background at startup,
+# so the first chat turn doesn't pay for them. With 0 they load on first use
+# and /ready reports ready as soon as the app has started.
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+
+_readiness = {"ready": False, "warmup": STARTUP_WARMUP, "warmup_seconds": None, "error": None}
+
+
+async def warm_up():
+    started = time.perf_counter()
+    try:
+        await embedding_service.warm_up()
+        await asyncio.to_thread(import_llm_sdk, os.getenv("LLM_PROVIDER", "claude"))
+    except Exception as e:
+        # Not ready; the lazy paths retry the load on first use
+        print(f"[DEBUG] Warm-up failed: {e}")
+        _readiness["error"] = str(e)
+        return
+    _readiness["warmup_seconds"] = round(time.perf_counter() - started, 2)
+    _readiness["ready"] = True
+    print(f"[DEBUG] Warm-up finished in {_readiness['warmup_seconds']}s")
+
+
+def start_warm_up() -> Optional[asyncio.Task]:
+    """Called from the lifespan; returns the warm-up task, or None when disabled."""
+    if not STARTUP_WARMUP:
+        _readiness["ready"] = True
+        return None
+    return asyncio.create_task(warm_up())
+
+
+def get_readiness() -> dict:
+    return dict(_readiness)
@@ -0,0 +1,44 @@
+"""add ANN index on memories.embedding
+
+Revision ID: 1234567890ad
+Revises: 1234567890ac
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1234567890ad'
+down_revision: Union[str, None] = '1234567890ac'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match the settings app.models uses for Memory.__table_args__
+MEMORY_VECTOR_INDEX = os.getenv("MEMORY_VECTOR_INDEX", "hnsw")
+MEMORY_HNSW_M = int(os.getenv("MEMORY_HNSW_M", "16"))
+MEMORY_HNSW_EF_CONSTRUCTION = int(os.getenv("MEMORY_HNSW_EF_CONSTRUCTION", "64"))
+MEMORY_IVFFLAT_LISTS = int(os.getenv("MEMORY_IVFFLAT_LISTS", "100"))
+
+
+def upgrade() -> None:
+    if MEMORY_VECTOR_INDEX == "ivfflat":
+        method = f"ivfflat (embedding vector_cosine_ops) WITH (lists = {MEMORY_IVFFLAT_LISTS})"
+    else:
+        method = (
+            f"hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = {MEMORY_HNSW_M}, ef_construction = {MEMORY_HNSW_EF_CONSTRUCTION})"
+        )
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    # Build without locking writes; CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_memories_embedding_ann ON memories USING {method}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_memories_embedding_ann")
@@ -0,0 +1,40 @@
+"""add message_count and last_message_at to conversations
+
+Revision ID: 1234567890ae
+Revises: 1234567890ad
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1234567890ae'
+down_revision: Union[str, None] = '1234567890ad'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('conversations', sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('conversations', sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True))
+    # Backfill from existing messages
+    op.execute("""
+        UPDATE conversations AS c
+        SET message_count = m.message_count,
+            last_message_at = m.last_message_at
+        FROM (
+            SELECT conversation_id, count(*) AS message_count, max(created_at) AS last_message_at
+            FROM messages
+            GROUP BY conversation_id
+        ) AS m
+        WHERE c.id = m.conversation_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('conversations', 'last_message_at')
+    op.drop_column('conversations', 'message_count')
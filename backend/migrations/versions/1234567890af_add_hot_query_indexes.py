@@ -0,0 +1,44 @@
+"""add composite and expression indexes for hot query paths
+
+Revision ID: 1234567890af
+Revises: 1234567890ae
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1234567890af'
+down_revision: Union[str, None] = '1234567890ae'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keep in sync with the Index() declarations at the bottom of app/models.py
+INDEXES = {
+    # messages WHERE conversation_id = ? ORDER BY created_at
+    "ix_messages_conversation_id_created_at": "messages (conversation_id, created_at)",
+    # conversations WHERE user_id = ? ORDER BY created_at DESC
+    "ix_conversations_user_id_created_at": "conversations (user_id, created_at DESC)",
+    # memories WHERE user_id = ? ORDER BY created_at DESC (profile dashboard, deletes)
+    "ix_memories_user_id_created_at": "memories (user_id, created_at DESC)",
+    # memories WHERE user_id = ? AND metadata_->>'category' = ? ORDER BY created_at DESC
+    "ix_memories_user_id_category_created_at": "memories (user_id, (metadata_ ->> 'category'), created_at DESC)",
+    # learning_progress WHERE metadata_->>'next_review_date' <= ? ORDER BY next_review_date
+    "ix_memories_user_id_category_next_review": "memories (user_id, (metadata_ ->> 'category'), (metadata_ ->> 'next_review_date'))",
+}
+
+
+def upgrade() -> None:
+    # Build without locking writes; CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, definition in INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name in INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
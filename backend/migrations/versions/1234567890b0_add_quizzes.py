@@ -0,0 +1,52 @@
+"""add quizzes and quiz_answers
+
+Revision ID: 1234567890b0
+Revises: 1234567890af
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1234567890b0'
+down_revision: Union[str, None] = '1234567890af'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'quizzes',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=True),
+        sa.Column('concept', sa.String(), nullable=True),
+        sa.Column('questions', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index('ix_quizzes_id', 'quizzes', ['id'])
+    op.create_index('ix_quizzes_user_id', 'quizzes', ['user_id'])
+
+    op.create_table(
+        'quiz_answers',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('quiz_id', sa.Integer(), sa.ForeignKey('quizzes.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('question_index', sa.Integer(), nullable=False),
+        sa.Column('answer', sa.Text(), nullable=True),
+        sa.Column('correct', sa.Integer(), nullable=True),
+        sa.Column('xp_awarded', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint('quiz_id', 'question_index', name='uq_quiz_answers_quiz_id_question_index'),
+    )
+    op.create_index('ix_quiz_answers_id', 'quiz_answers', ['id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_quiz_answers_id', table_name='quiz_answers')
+    op.drop_table('quiz_answers')
+    op.drop_index('ix_quizzes_user_id', table_name='quizzes')
+    op.drop_index('ix_quizzes_id', table_name='quizzes')
+    op.drop_table('quizzes')
@@ -0,0 +1,36 @@
+"""add pre-generated review quiz columns to quizzes
+
+Revision ID: 1234567890b1
+Revises: 1234567890b0
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1234567890b1'
+down_revision: Union[str, None] = '1234567890b0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('quizzes', sa.Column('pregenerated', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('quizzes', sa.Column('served_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('quizzes', sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True))
+    # Unserved pre-generated quizzes only; looked up on every turn with due items
+    op.create_index(
+        'ix_quizzes_ready', 'quizzes', ['user_id', 'concept'],
+        postgresql_where=sa.text('pregenerated = 1 AND served_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_quizzes_ready', table_name='quizzes')
+    op.drop_column('quizzes', 'expires_at')
+    op.drop_column('quizzes', 'served_at')
+    op.drop_column('quizzes', 'pregenerated')
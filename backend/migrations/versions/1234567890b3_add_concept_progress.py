@@ -0,0 +1,104 @@
+"""add concept_progress and collapse learning_progress memories into it
+
+Revision ID: 1234567890b3
+Revises: 1234567890b2
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1234567890b3'
+down_revision: Union[str, None] = '1234567890b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same normalization as srs.normalize_concept: trimmed, single-spaced, lower case
+CONCEPT_KEY = "lower(regexp_replace(btrim(content), '\\s+', ' ', 'g'))"
+
+
+def upgrade() -> None:
+    op.create_table(
+        'concept_progress',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('concept_key', sa.String(), nullable=False),
+        sa.Column('concept', sa.String(), nullable=False),
+        sa.Column('state', sa.String(), nullable=True),
+        sa.Column('performance', sa.String(), nullable=True),
+        sa.Column('last_reviewed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('next_review_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('review_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.UniqueConstraint('user_id', 'concept_key', name='uq_concept_progress_user_id_concept_key'),
+    )
+    op.create_index('ix_concept_progress_id', 'concept_progress', ['id'])
+    op.create_index('ix_concept_progress_user_id_next_review_at', 'concept_progress', ['user_id', 'next_review_at'])
+    op.create_index(
+        'ix_concept_progress_user_id_updated_at', 'concept_progress',
+        ['user_id', sa.text('updated_at DESC')]
+    )
+
+    # One row per (user, concept): the latest update wins, every update counts as a review
+    op.execute(f"""
+        INSERT INTO concept_progress (
+            user_id, concept_key, concept, state, performance,
+            last_reviewed_at, next_review_at, review_count, created_at, updated_at
+        )
+        SELECT DISTINCT ON (user_id, {CONCEPT_KEY})
+            user_id,
+            {CONCEPT_KEY},
+            btrim(content),
+            metadata_ ->> 'state',
+            metadata_ ->> 'last_performance',
+            (metadata_ ->> 'last_reviewed_date')::timestamp,
+            (metadata_ ->> 'next_review_date')::timestamp,
+            count(*) OVER (PARTITION BY user_id, {CONCEPT_KEY}),
+            min(created_at) OVER (PARTITION BY user_id, {CONCEPT_KEY}),
+            created_at
+        FROM memories
+        WHERE metadata_ ->> 'category' = 'learning_progress'
+          AND user_id IS NOT NULL
+          AND btrim(coalesce(content, '')) <> ''
+        ORDER BY user_id, {CONCEPT_KEY}, created_at DESC, id DESC
+    """)
+    op.execute("DELETE FROM memories WHERE metadata_ ->> 'category' = 'learning_progress'")
+
+    # Nothing reads next_review_date from memories any more
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_memories_user_id_category_next_review")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_memories_user_id_category_next_review "
+            "ON memories (user_id, (metadata_ ->> 'category'), (metadata_ ->> 'next_review_date'))"
+        )
+
+    # Back to one learning_progress memory per concept; embeddings are not restored
+    op.execute("""
+        INSERT INTO memories (user_id, content, metadata_, created_at)
+        SELECT
+            user_id,
+            concept,
+            json_build_object(
+                'category', 'learning_progress',
+                'state', state,
+                'last_performance', performance,
+                'last_reviewed_date', to_char(last_reviewed_at, 'YYYY-MM-DD"T"HH24:MI:SS'),
+                'next_review_date', to_char(next_review_at, 'YYYY-MM-DD"T"HH24:MI:SS')
+            ),
+            updated_at
+        FROM concept_progress
+    """)
+
+    op.drop_index('ix_concept_progress_user_id_updated_at', table_name='concept_progress')
+    op.drop_index('ix_concept_progress_user_id_next_review_at', table_name='concept_progress')
+    op.drop_index('ix_concept_progress_id', table_name='concept_progress')
+    op.drop_table('concept_progress')
@@ -0,0 +1,41 @@
+"""add SM-2 schedule columns to concept_progress
+
+Revision ID: 1234567890b4
+Revises: 1234567890b3
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1234567890b4'
+down_revision: Union[str, None] = '1234567890b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('concept_progress', sa.Column('ease', sa.Float(), server_default='2.5', nullable=False))
+    op.add_column('concept_progress', sa.Column('interval_days', sa.Float(), server_default='0', nullable=False))
+    op.add_column('concept_progress', sa.Column('repetitions', sa.Integer(), server_default='0', nullable=False))
+
+    # Carry over the interval the old 1/3/14-day rule assigned; a low-performance
+    # review counts as a lapse, anything else as a run of successful reviews
+    op.execute("""
+        UPDATE concept_progress SET
+            interval_days = greatest(
+                round((extract(epoch FROM next_review_at - last_reviewed_at) / 86400)::numeric, 1), 0
+            ),
+            repetitions = CASE WHEN performance = 'low' THEN 0 ELSE review_count END
+        WHERE next_review_at IS NOT NULL AND last_reviewed_at IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('concept_progress', 'repetitions')
+    op.drop_column('concept_progress', 'interval_days')
+    op.drop_column('concept_progress', 'ease')
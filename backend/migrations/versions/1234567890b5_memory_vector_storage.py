@@ -0,0 +1,74 @@
+"""convert memories.embedding to the configured storage mode (halfvec / binary)
+
+Revision ID: 1234567890b5
+Revises: 1234567890b4
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1234567890b5'
+down_revision: Union[str, None] = '1234567890b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Must match the settings app.models uses for Memory. To switch modes later,
+# downgrade to 1234567890b4, change MEMORY_VECTOR_STORAGE and upgrade again.
+MEMORY_VECTOR_STORAGE = os.getenv("MEMORY_VECTOR_STORAGE", "vector")
+MEMORY_VECTOR_INDEX = os.getenv("MEMORY_VECTOR_INDEX", "hnsw")
+MEMORY_HNSW_M = int(os.getenv("MEMORY_HNSW_M", "16"))
+MEMORY_HNSW_EF_CONSTRUCTION = int(os.getenv("MEMORY_HNSW_EF_CONSTRUCTION", "64"))
+MEMORY_IVFFLAT_LISTS = int(os.getenv("MEMORY_IVFFLAT_LISTS", "100"))
+DIM = 384
+
+
+def _ann_method(column: str, ops: str) -> str:
+    if MEMORY_VECTOR_INDEX == "ivfflat" and ops != "bit_hamming_ops":
+        return f"ivfflat ({column} {ops}) WITH (lists = {MEMORY_IVFFLAT_LISTS})"
+    return f"hnsw ({column} {ops}) WITH (m = {MEMORY_HNSW_M}, ef_construction = {MEMORY_HNSW_EF_CONSTRUCTION})"
+
+
+def upgrade() -> None:
+    if MEMORY_VECTOR_STORAGE == "halfvec":
+        # Rewrites the table; the float32 index cannot serve halfvec, so it is rebuilt
+        op.execute("DROP INDEX IF EXISTS ix_memories_embedding_ann")
+        op.execute(f"ALTER TABLE memories ALTER COLUMN embedding TYPE halfvec({DIM}) USING embedding::halfvec({DIM})")
+        with op.get_context().autocommit_block():
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_memories_embedding_ann "
+                f"ON memories USING {_ann_method('embedding', 'halfvec_cosine_ops')}"
+            )
+    elif MEMORY_VECTOR_STORAGE == "binary":
+        op.execute(
+            f"ALTER TABLE memories ADD COLUMN embedding_bits bit({DIM}) "
+            f"GENERATED ALWAYS AS (binary_quantize(embedding)::bit({DIM})) STORED"
+        )
+        with op.get_context().autocommit_block():
+            op.execute(
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_memories_embedding_bits_ann "
+                f"ON memories USING {_ann_method('embedding_bits', 'bit_hamming_ops')}"
+            )
+            # Candidates come from the bit index; the float index is no longer used
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_memories_embedding_ann")
+
+
+def downgrade() -> None:
+    if MEMORY_VECTOR_STORAGE == "halfvec":
+        op.execute("DROP INDEX IF EXISTS ix_memories_embedding_ann")
+        op.execute(f"ALTER TABLE memories ALTER COLUMN embedding TYPE vector({DIM}) USING embedding::vector({DIM})")
+    elif MEMORY_VECTOR_STORAGE == "binary":
+        with op.get_context().autocommit_block():
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_memories_embedding_bits_ann")
+        op.execute("ALTER TABLE memories DROP COLUMN IF EXISTS embedding_bits")
+    else:
+        return
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_memories_embedding_ann "
+            f"ON memories USING {_ann_method('embedding', 'vector_cosine_ops')}"
+        )
@@ -0,0 +1,40 @@
+"""key pre-generated quizzes by normalized concept
+
+Revision ID: 1234567890b6
+Revises: 1234567890b5
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1234567890b6'
+down_revision: Union[str, None] = '1234567890b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same normalization as srs.normalize_concept: trimmed, single-spaced, lower case
+CONCEPT_KEY = "lower(regexp_replace(btrim(concept), '\\s+', ' ', 'g'))"
+
+
+def upgrade() -> None:
+    op.add_column('quizzes', sa.Column('concept_key', sa.String(), nullable=True))
+    op.execute(f"UPDATE quizzes SET concept_key = {CONCEPT_KEY} WHERE concept IS NOT NULL")
+    op.drop_index('ix_quizzes_ready', table_name='quizzes')
+    op.create_index(
+        'ix_quizzes_ready', 'quizzes', ['user_id', 'concept_key'],
+        postgresql_where=sa.text('pregenerated = 1 AND served_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_quizzes_ready', table_name='quizzes')
+    op.create_index(
+        'ix_quizzes_ready', 'quizzes', ['user_id', 'concept'],
+        postgresql_where=sa.text('pregenerated = 1 AND served_at IS NULL')
+    )
+    op.drop_column('quizzes', 'concept_key')
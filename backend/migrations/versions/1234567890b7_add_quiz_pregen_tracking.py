@@ -0,0 +1,30 @@
+"""track review quiz pre-generation attempts on concept_progress
+
+Revision ID: 1234567890b7
+Revises: 1234567890b6
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1234567890b7'
+down_revision: Union[str, None] = '1234567890b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('concept_progress', sa.Column('quiz_pregen_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('concept_progress', sa.Column('quiz_pregen_failures', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('concept_progress', sa.Column('quiz_pregen_retry_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('concept_progress', 'quiz_pregen_retry_at')
+    op.drop_column('concept_progress', 'quiz_pregen_failures')
+    op.drop_column('concept_progress', 'quiz_pregen_at')
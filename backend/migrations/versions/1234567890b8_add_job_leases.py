@@ -0,0 +1,30 @@
+"""add worker leases and retry backoff to jobs
+
+Revision ID: 1234567890b8
+Revises: 1234567890b7
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1234567890b8'
+down_revision: Union[str, None] = '1234567890b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('jobs', sa.Column('run_after', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False))
+    op.add_column('jobs', sa.Column('locked_by', sa.String(), nullable=True))
+    op.add_column('jobs', sa.Column('locked_until', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('jobs', 'locked_until')
+    op.drop_column('jobs', 'locked_by')
+    op.drop_column('jobs', 'run_after')
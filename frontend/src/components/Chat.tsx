@@ -20,6 +20,18 @@ interface ChatProps {
     onTitleUpdate?: (conversationId: number, newTitle: string) => void;
 }
 
+// Poll a deferred backend job (e.g. conversation title) until it finishes
+async function pollJob(jobId: number, intervalMs = 1000, maxAttempts = 30) {
+    for (let i = 0; i < maxAttempts; i++) {
+        const res = await axios.get(`/jobs/${jobId}`);
+        if (res.data.status === 'done' || res.data.status === 'failed') {
+            return res.data;
+        }
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+    return null;
+}
+
 export function Chat({ conversationId, onRollover, onTitleUpdate }: ChatProps) {
     const [messages, setMessages] = useState<Message[]>([]);
     const [input, setInput] = useState('');
@@ -114,9 +126,13 @@ export function Chat({ conversationId, onRollover, onTitleUpdate }: ChatProps) {
                 const aiMessage: Message = { role: 'assistant', content: data.response };
                 setMessages(prev => [...prev, aiMessage]);
 
-                // Handle auto-generated title for new chats
-                if (data.new_title && onTitleUpdate) {
-                    onTitleUpdate(conversationId, data.new_title);
+                // Auto-generated title for new chats arrives from a background job
+                if (data.title_job_id && onTitleUpdate) {
+                    pollJob(data.title_job_id).then(job => {
+                        if (job?.status === 'done') {
+                            onTitleUpdate(conversationId, job.result.title);
+                        }
+                    }).catch(err => console.error(err));
                 }
             }
 
@@ -243,6 +259,8 @@ export function Chat({ conversationId, onRollover, onTitleUpdate }: ChatProps) {
                                                 {quizMatch && (() => {
                                                     const quizData = JSON.parse(quizMatch[1]);
                                                     return <QuizCard data={quizData} onComplete={(xp) => {
+                                                        // Stored quizzes award XP per answer server-side
+                                                        if (quizData.quiz_id) return;
                                                         axios.post(`/conversations/${conversationId}/messages`, {
                                                             message: `[System Event] User completed quiz with ${xp} XP.`
                                                         }).catch(err => console.error(err));
@@ -1,4 +1,5 @@
 import { useState } from 'react';
+import axios from 'axios';
 import { HelpCircle, CheckCircle2, XCircle, ChevronRight, Trophy } from 'lucide-react';
 
 interface Question {
@@ -12,6 +13,8 @@ interface Question {
 
 interface QuizCardProps {
     data: {
+        // Set for quizzes stored server-side; answers are graded via POST /quizzes/{id}/answers
+        quiz_id?: number;
         questions?: Question[];
         // Legacy single question format
         question?: string;
@@ -58,6 +61,12 @@ export function QuizCard({ data, onComplete }: QuizCardProps) {
             setTotalXpEarned(prev => prev + currentXpAvailable);
             setCorrectAnswers(prev => prev + 1);
         }
+
+        if (data.quiz_id) {
+            axios.post(`/quizzes/${data.quiz_id}/answers`, {
+                answers: [{ question_index: currentQuestionIndex, answer: option, hint_used: showHint }]
+            }).catch(err => console.error(err));
+        }
     };
 
     const handleNextQuestion = () => {